@@ -64,7 +64,22 @@ PROFILE_LIST_DESCRIPTION = """
 This endpoint retrieves the profile details of the authenticated user. It returns the user's information.
 
 **Response:**
-The API returns the profile information of the authenticated user. 
+The API returns a list holding only the profile information of the authenticated user.
+
+**Note:**
+- The user must be authenticated to access this endpoint.
+"""
+
+PROFILE_RETRIEVE_DESCRIPTION = """
+**Description:**
+This endpoint retrieves the profile details of the authenticated user as a single object.
+
+**Conditional Requests:**
+Responses carry `ETag` and `Last-Modified` headers derived from the user's last update. Send them back in
+`If-None-Match` / `If-Modified-Since` to get an empty `304 Not Modified` while the profile is unchanged.
+
+**Response:**
+The API returns the profile information of the authenticated user.
 
 **Note:**
 - The user must be authenticated to access this endpoint.
@@ -88,8 +103,11 @@ RECENT_ACTIVITY_LIST_DESCRIPTION = """
 **Description:**
 This endpoint retrieves the recent session data of the authenticated user, ordered by the session start time in descending order.
 
+**Pagination:**
+Pages are linked by the `next` and `previous` cursor URLs, `size` sets the page size (at most 100). Requests with a `page` number are paginated by page number, as before the cursors.
+
 **Response:**
-The API returns a list of session details, including information about each session's start time, end time, and the user associated with the session.
+The API returns a list of session details, including information about each session's start time, end time, and the user associated with the session, along with the number of sessions (`count`), the number of distinct devices used (`distinct_device_count`) and the time of the first login (`first_login`).
 
 **Note:**
 - The user must be authenticated to access this endpoint.
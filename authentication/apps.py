@@ -10,3 +10,7 @@ class AuthenticationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "authentication"
 
+    def ready(self):
+        # invalidate cached users of CachedJWTAuthentication, and check the
+        # caches they are invalidated in are shared
+        from authentication import checks, signals  # noqa: F401
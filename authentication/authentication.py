@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.db_router import route_for_user
+
+# Bump when the User model changes, so field values cached by an older
+# release are not read back
+USER_CACHE_VERSION = 2
+
+
+def get_user_cache_key(user_id):
+    return "jwt_user:v%s:%s" % (USER_CACHE_VERSION, user_id)
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drops the cached user now and again once the current transaction
+    commits, so a request reading the old row in the meantime cannot leave
+    it cached.
+    """
+    cache = caches[settings.JWT_USER_CACHE_ALIAS]
+    key = get_user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that caches the authenticated user for
+    JWT_USER_CACHE_TTL seconds, so most requests do not SELECT the user.
+
+    The cache holds the user's field values without the password hash, and
+    a digest of the hash for CHECK_REVOKE_TOKEN. Cached users are
+    invalidated on save, delete and soft delete, see `authentication.signals`,
+    which requires a cache shared by all processes (see
+    `authentication.checks`); with a TTL of 0 nothing is cached. Updates
+    bypassing the signals, e.g. QuerySet.update(), are picked up once the
+    entry expires.
+    """
+
+    def get_cached_field_names(self):
+        return [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.attname != "password"
+        ]
+
+    def get_cached_user(self, user_id):
+        """
+        Returns the user and the digest of their password hash. Users built
+        from the cache have the password deferred, so saving them does not
+        touch it.
+        """
+        lookup = {api_settings.USER_ID_FIELD: user_id}
+        if not settings.JWT_USER_CACHE_TTL:
+            user = self.user_model.objects.get(**lookup)
+            return user, get_md5_hash_password(user.password)
+
+        cache = caches[settings.JWT_USER_CACHE_ALIAS]
+        key = get_user_cache_key(user_id)
+        field_names = self.get_cached_field_names()
+        cached = cache.get(key)
+        if cached is None:
+            *values, password = (
+                self.user_model.objects.filter(**lookup)
+                .values_list(*field_names, "password")
+                .get()
+            )
+            cached = (values, get_md5_hash_password(password))
+            cache.set(key, cached, settings.JWT_USER_CACHE_TTL)
+
+        values, password_digest = cached
+        user = self.user_model.from_db(
+            router.db_for_read(self.user_model), field_names, values
+        )
+        return user, password_digest
+
+    def get_user(self, validated_token):
+        """
+        Same checks as JWTAuthentication.get_user, on the cached user.
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # reads the user from the primary database if they wrote recently
+        route_for_user(user_id)
+        try:
+            user, password_digest = self.get_cached_user(user_id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+from django.utils.module_loading import import_string
+
+from authentication.otp_store import CacheOTPStore
+
+# (cache alias setting, TTL setting) of caches invalidated by signals, which
+# only reach the caches of the process handling the change
+INVALIDATED_CACHES = [
+    ("JWT_USER_CACHE_ALIAS", "JWT_USER_CACHE_TTL"),
+    ("PERMISSION_CACHE_ALIAS", "PERMISSION_CACHE_TTL"),
+]
+
+
+@register()
+def check_invalidated_caches_are_shared(app_configs, **kwargs):
+    """
+    Errors for invalidated caches kept in a per-process cache, other worker
+    processes would keep serving stale entries until they expire.
+    """
+    errors = []
+    for alias_setting, ttl_setting in INVALIDATED_CACHES:
+        alias = getattr(settings, alias_setting)
+        if getattr(settings, ttl_setting) and isinstance(caches[alias], LocMemCache):
+            errors.append(
+                Error(
+                    "%s is enabled but the %r cache is local to each process."
+                    % (ttl_setting, alias),
+                    hint="Set CACHE_URL to a shared cache (Redis, Memcached) "
+                    "or %s to 0." % ttl_setting,
+                    id="authentication.E001",
+                )
+            )
+    return errors
+
+
+@register()
+def check_otp_cache_is_shared(app_configs, **kwargs):
+    """
+    Error for CacheOTPStore kept in a per-process cache, an OTP stored by
+    one worker process could not be verified by another.
+    """
+    if issubclass(import_string(settings.OTP_STORE), CacheOTPStore) and isinstance(
+        caches[settings.OTP_CACHE_ALIAS], LocMemCache
+    ):
+        return [
+            Error(
+                "OTP_STORE is %s but the %r cache is local to each process."
+                % (settings.OTP_STORE, settings.OTP_CACHE_ALIAS),
+                hint="Set CACHE_URL to a shared cache (Redis, Memcached) or "
+                "OTP_STORE to authentication.otp_store.DatabaseOTPStore.",
+                id="authentication.E002",
+            )
+        ]
+    return []
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from authentication.models import Session, UserActivitySummary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the UserActivitySummary of every user with sessions, in "
+        "batches of users committed one at a time. Safe to rerun, existing "
+        "summaries are overwritten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        batch_size = options["batch_size"]
+        sessions = Session.objects.using(using)
+
+        last_user_id = None
+        total = 0
+        while True:
+            user_ids = sessions.order_by("user_id").values_list("user_id", flat=True)
+            if last_user_id is not None:
+                user_ids = user_ids.filter(user_id__gt=last_user_id)
+            user_ids = list(user_ids.distinct()[:batch_size])
+            if not user_ids:
+                break
+
+            rows = (
+                sessions.filter(user_id__in=user_ids)
+                .values("user_id")
+                .annotate(
+                    first_login=Min("start_time"),
+                    distinct_device_count=Count("device_id", distinct=True),
+                    total_sessions=Count("id"),
+                )
+                .order_by()
+            )
+            summaries = [UserActivitySummary(**row) for row in rows]
+            with transaction.atomic(using=using):
+                UserActivitySummary.objects.using(using).bulk_create(
+                    summaries,
+                    update_conflicts=True,
+                    unique_fields=["user"],
+                    update_fields=[
+                        "first_login",
+                        "distinct_device_count",
+                        "total_sessions",
+                    ],
+                )
+
+            last_user_id = user_ids[-1]
+            total += len(summaries)
+            self.stdout.write("user_id <= %s: %d summaries" % (last_user_id, total))
+
+        self.stdout.write(self.style.SUCCESS("Backfilled %d summaries" % total))
@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from authentication.models import User
+from authentication.views import CustomTokenObtainPairView
+
+HASHERS = {
+    # the first configured hasher at its production iteration count
+    "production hasher": None,
+    # near-free hashing, leaves the cost of the rest of the login path
+    "fast hasher": ["django.contrib.auth.hashers.MD5PasswordHasher"],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login requests per second on one core, in this process and "
+        "thread, with the production password hasher and with a near-free "
+        "one. Background tasks (the activity summary update) are queued, not "
+        "run, and all benchmark data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+
+    def handle(self, *args, **options):
+        view = CustomTokenObtainPairView.as_view()
+        factory = APIRequestFactory()
+
+        for title, password_hashers in HASHERS.items():
+            overrides = {"TASK_BACKEND": "core.tasks.LocmemTaskBackend"}
+            if password_hashers:
+                overrides["PASSWORD_HASHERS"] = password_hashers
+
+            with override_settings(**overrides), transaction.atomic():
+                hasher = get_hasher()
+                User.objects.create_user(
+                    email="login-benchmark@example.com", password="benchmark"
+                )
+
+                def login():
+                    request = factory.post(
+                        "/api/auth/login/",
+                        {
+                            "email": "login-benchmark@example.com",
+                            "password": "benchmark",
+                            "deviceId": "benchmark",
+                        },
+                        format="json",
+                    )
+                    response = view(request)
+                    assert response.status_code == 200, response.data
+
+                for _ in range(options["warmup"]):
+                    login()
+                started = time.perf_counter()
+                for _ in range(options["requests"]):
+                    login()
+                elapsed = time.perf_counter() - started
+
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                "%-18s %-8s (%s iterations): %7.1f logins/s, %6.2f ms per login"
+                % (
+                    title,
+                    hasher.algorithm,
+                    getattr(hasher, "iterations", "-"),
+                    options["requests"] / elapsed,
+                    elapsed * 1000 / options["requests"],
+                )
+            )
@@ -0,0 +1,89 @@
+import time
+
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from authentication.models import User
+from authentication.permissions import GroupPermission, find_permission
+
+
+class PerRequestGroupPermission(permissions.BasePermission):
+    """
+    Permission check without the cross-request cache, user and group
+    permissions are loaded on every request by has_perm.
+    """
+
+    def has_permission(self, request, view):
+        return request.user.has_perm(find_permission(view.app_model, request))
+
+
+class BenchmarkView(APIView):
+    app_model = ("authentication", "session")
+
+    def get(self, request):
+        return Response()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure permission-gated requests per second for a user in many "
+        "groups, loading permissions per request and with the cached "
+        "permission table of GroupPermission (with PERMISSION_CACHE_TTL=300 "
+        "in this process). All benchmark data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--permissions-per-group", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.populate(options["groups"], options["permissions_per_group"])
+            for title, permission_class in (
+                ("per request", PerRequestGroupPermission),
+                ("cached", GroupPermission),
+            ):
+                view = BenchmarkView.as_view(permission_classes=[permission_class])
+                with override_settings(PERMISSION_CACHE_TTL=300):
+                    self.report(title, view, user.pk, options["requests"])
+            transaction.set_rollback(True)
+
+    def populate(self, groups, permissions_per_group):
+        user = User.objects.create_user(email="permission-benchmark@example.com")
+        all_permissions = list(Permission.objects.all())
+        for i in range(groups):
+            group = Group.objects.create(name="permission-benchmark-%d" % i)
+            start = i * permissions_per_group % len(all_permissions)
+            group.permissions.set(
+                (all_permissions * 2)[start : start + permissions_per_group]
+            )
+            user.groups.add(group)
+        # the permission the benchmark view requires, through the last group
+        group.permissions.add(
+            Permission.objects.get(
+                content_type__app_label="authentication", codename="view_session"
+            )
+        )
+        return user
+
+    def report(self, title, view, user_id, requests):
+        factory = APIRequestFactory()
+        started = time.perf_counter()
+        for _ in range(requests):
+            request = factory.get("/")
+            # a fresh user per request, as loaded by the authentication class
+            force_authenticate(request, User(pk=user_id, is_active=True))
+            response = view(request)
+            assert response.status_code == 200, response.status_code
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            "%-12s %8.0f requests/s, %6.3f ms per request"
+            % (title, requests / elapsed, elapsed * 1000 / requests)
+        )
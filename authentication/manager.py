@@ -33,7 +33,7 @@ class UserManager(BaseUserManager):
 
         user = self.model(email=email, phone=phone, **extra_fields)
         user.set_password(password)
-        user.save(using=self.db)
+        user.save(using=self._db)
         return user
 
     def create_superuser(self, email=None, phone=None, password=None, **extra_fields):
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_session_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivitySummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('first_login', models.DateTimeField(null=True)),
+                ('distinct_device_count', models.PositiveIntegerField(default=0)),
+                ('total_sessions', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'UserActivitySummary',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:12
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_start_time(apps, schema_editor):
+    """
+    Sessions without a start time started an hour before their end time,
+    see Session.save. Those without either are ordered before all others.
+    """
+    Session = apps.get_model("authentication", "Session")
+    sessions = Session.objects.using(schema_editor.connection.alias).filter(
+        start_time__isnull=True
+    )
+    sessions.filter(end_time__isnull=False).update(
+        start_time=F("end_time") - timedelta(hours=1)
+    )
+    sessions.update(start_time=datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0003_user_activity_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_start_time, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='session',
+            name='start_time',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
@@ -89,7 +89,7 @@ class Session(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="user_sessions"
     )
-    start_time = models.DateTimeField(auto_now_add=True, null=True)
+    start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True)
     remote_address = models.CharField(
         max_length=100, null=True, blank=True, default=None
@@ -132,3 +132,39 @@ class Session(models.Model):
 
     class Meta:
         db_table = "Session"
+        indexes = [
+            # latest/recent sessions of a user, with the id tie-break of
+            # their keyset pagination
+            models.Index(
+                fields=["user", "-start_time", "-id"], name="session_user_start_idx"
+            ),
+            # distinct devices of a user, answered from the index alone
+            models.Index(fields=["user", "device_id"], name="session_user_device_idx"),
+        ]
+
+
+class UserActivitySummary(models.Model):
+    """
+    Denormalized login activity of a user, kept up to date as sessions are
+    created so the recent activity endpoint does not aggregate over every
+    session the user ever had.
+
+    Attributes:
+        - `user`: The user the summary belongs to, also its primary key.
+        - `first_login`: Start time of the user's first session.
+        - `distinct_device_count`: Number of distinct non-null device IDs logged in from.
+        - `total_sessions`: Number of sessions of the user.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="activity_summary",
+    )
+    first_login = models.DateTimeField(null=True)
+    distinct_device_count = models.PositiveIntegerField(default=0)
+    total_sessions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "UserActivitySummary"
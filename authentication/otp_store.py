@@ -0,0 +1,127 @@
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+from authentication.models import EmailPhoneVerification
+
+
+class OTPNotFound(Exception):
+    """
+    Raised when no OTP was generated for the given email/phone.
+    """
+
+
+def get_lookup(email=None, phone=None):
+    """
+    Returns the field and value an OTP is stored under, email takes
+    precedence over phone.
+    """
+    if email:
+        return "email", email
+    return "phone", phone
+
+
+class DatabaseOTPStore:
+    """
+    Keeps OTPs and temporary tokens in `EmailPhoneVerification` rows, with
+    their expiry in the `otp_expiry` and `temp_token_expiry` columns.
+    """
+
+    def set_otp(self, otp, email=None, phone=None):
+        field, value = get_lookup(email, phone)
+        EmailPhoneVerification.objects.update_or_create(
+            **{field: value},
+            defaults={
+                "otp": otp,
+                "otp_expiry": timezone.now() + timedelta(seconds=settings.OTP_TTL),
+                "is_verified": False,
+            },
+        )
+
+    def get_verification(self, email=None, phone=None):
+        field, value = get_lookup(email, phone)
+        try:
+            return EmailPhoneVerification.objects.get(**{field: value})
+        except EmailPhoneVerification.DoesNotExist:
+            raise OTPNotFound
+
+    def check_otp(self, otp, email=None, phone=None):
+        return self.get_verification(email, phone).is_otp_valid(otp)
+
+    def set_temp_token(self, token, email=None, phone=None):
+        field, value = get_lookup(email, phone)
+        EmailPhoneVerification.objects.filter(**{field: value}).update(
+            temp_token=token,
+            temp_token_expiry=timezone.now()
+            + timedelta(seconds=settings.OTP_TEMP_TOKEN_TTL),
+        )
+
+    def check_temp_token(self, token, email=None, phone=None):
+        verification = self.get_verification(email, phone)
+        return token is not None and verification.is_temp_token_valid(token)
+
+    def clear_temp_token(self, email=None, phone=None):
+        field, value = get_lookup(email, phone)
+        EmailPhoneVerification.objects.filter(**{field: value}).update(
+            temp_token=None
+        )
+
+
+class CacheOTPStore:
+    """
+    Keeps OTPs and temporary tokens in the OTP_CACHE_ALIAS cache, expiring
+    them with the cache's native TTLs instead of writing to the database.
+    """
+
+    def __init__(self):
+        self.cache = caches[settings.OTP_CACHE_ALIAS]
+
+    def get_key(self, prefix, email=None, phone=None):
+        return "%s:%s:%s" % (prefix, *get_lookup(email, phone))
+
+    def set_otp(self, otp, email=None, phone=None):
+        self.cache.set(self.get_key("otp", email, phone), otp, settings.OTP_TTL)
+
+    def check_otp(self, otp, email=None, phone=None):
+        stored_otp = self.cache.get(self.get_key("otp", email, phone))
+        if stored_otp is None:
+            raise OTPNotFound
+        return constant_time_compare(stored_otp, otp)
+
+    def set_temp_token(self, token, email=None, phone=None):
+        self.cache.set(
+            self.get_key("otp_token", email, phone),
+            token,
+            settings.OTP_TEMP_TOKEN_TTL,
+        )
+
+    def check_temp_token(self, token, email=None, phone=None):
+        stored_token = self.cache.get(self.get_key("otp_token", email, phone))
+        if stored_token is None:
+            raise OTPNotFound
+        return token is not None and constant_time_compare(stored_token, token)
+
+    def clear_temp_token(self, email=None, phone=None):
+        self.cache.delete(self.get_key("otp_token", email, phone))
+
+
+@lru_cache(maxsize=None)
+def get_otp_store():
+    """
+    Returns the OTP store configured by OTP_STORE.
+    """
+    return import_string(settings.OTP_STORE)()
+
+
+def reset_otp_store(setting, **kwargs):
+    if setting in ("OTP_STORE", "OTP_CACHE_ALIAS", "CACHES"):
+        get_otp_store.cache_clear()
+
+
+setting_changed.connect(reset_otp_store)
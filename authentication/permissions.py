@@ -1,11 +1,28 @@
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework import permissions
 
+# Permission action required for each HTTP method, other methods are denied
+METHOD_ACTIONS = {
+    "GET": "view",
+    "POST": "add",
+    "PUT": "change",
+    "PATCH": "change",
+    "DELETE": "delete",
+}
+
+PERMISSION_VERSION_KEY = "perms:version"
+
 
 class GroupPermission(permissions.BasePermission):
     """
     Custom permission class to dynamically determine required permissions based on HTTP method and model.
 
-    This class leverages Django's built-in permission system to enforce access control.
+    This class leverages Django's built-in permission system to enforce access control. The permissions
+    of a user are cached across requests, see `get_user_permissions`.
     """
 
     def has_permission(self, request, view):
@@ -19,13 +36,37 @@ class GroupPermission(permissions.BasePermission):
         Returns:
             bool: True if the user has the required permission, False otherwise.
         """
+        # Active superusers have every permission, for any method
+        user = request.user
+        if user.is_active and user.is_superuser:
+            return True
+
         app_model = getattr(view, "app_model", None)
         required_permission = find_permission(app_model, request)
-        # print(request.user.get_all_permissions())
-        # print("Required Perms",required_permission)
+        if required_permission is None:
+            return False
 
         # Check if the user has the required permission
-        return request.user.has_perm(required_permission)
+        return required_permission in get_user_permissions(user)
+
+
+@lru_cache(maxsize=None)
+def get_permission_table(app_model):
+    """
+    Returns the permission required for each HTTP method on a model, built
+    once per (app_label, model) and reused by every request.
+
+    Args:
+        app_model (tuple): A tuple containing the app name and model name.
+
+    Returns:
+        dict: Permission strings by HTTP method.
+    """
+    app_label, model_name = app_model
+    return {
+        method: f"{app_label}.{action}_{model_name}"
+        for method, action in METHOD_ACTIONS.items()
+    }
 
 
 def find_permission(app_model, request):
@@ -37,16 +78,55 @@ def find_permission(app_model, request):
         request (HttpRequest): The incoming HTTP request.
 
     Returns:
-        str: The required permission string.
-    """
-
-    if request.method == "GET":
-        return f"{app_model[0]}.view_{app_model[1]}"
-    elif request.method == "POST":
-        return f"{app_model[0]}.add_{app_model[1]}"
-    elif request.method == "PUT":
-        return f"{app_model[0]}.change_{app_model[1]}"
-    elif request.method == "PATCH":
-        return f"{app_model[0]}.change_{app_model[1]}"
-    elif request.method == "DELETE":
-        return f"{app_model[0]}.delete_{app_model[1]}"
+        str: The required permission string, None for other methods.
+    """
+    return get_permission_table(tuple(app_model)).get(request.method)
+
+
+def get_permission_version(cache):
+    version = cache.get(PERMISSION_VERSION_KEY)
+    if version is None:
+        # start from the clock, a version key lost to eviction must not
+        # restart at a number stale entries were cached under
+        cache.add(PERMISSION_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(PERMISSION_VERSION_KEY)
+    return version
+
+
+def get_user_permissions_cache_key(user_id, version):
+    return "perms:v%s:%s" % (version, user_id)
+
+
+def get_user_permissions(user):
+    """
+    Returns the set of permissions of the user (from the user and their
+    groups), cached for PERMISSION_CACHE_TTL seconds under the current
+    permission version. Any change of groups, permissions or memberships
+    bumps the version, see `bump_permission_version`. With a TTL of 0 they
+    are loaded on every request.
+    """
+    if not user.is_active:
+        return frozenset()
+    if not settings.PERMISSION_CACHE_TTL:
+        return frozenset(user.get_all_permissions())
+    cache = caches[settings.PERMISSION_CACHE_ALIAS]
+    key = get_user_permissions_cache_key(user.pk, get_permission_version(cache))
+    user_permissions = cache.get(key)
+    if user_permissions is None:
+        user_permissions = frozenset(user.get_all_permissions())
+        cache.set(key, user_permissions, settings.PERMISSION_CACHE_TTL)
+    return user_permissions
+
+
+def bump_permission_version():
+    """
+    Invalidates the cached permissions of all users at once.
+    """
+    cache = caches[settings.PERMISSION_CACHE_ALIAS]
+    get_permission_version(cache)
+    try:
+        cache.incr(PERMISSION_VERSION_KEY)
+    except ValueError:
+        # evicted in between
+        cache.add(PERMISSION_VERSION_KEY, time.time_ns(), None)
+
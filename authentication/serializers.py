@@ -1,10 +1,30 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 from authentication import helpers, models, services
+from core.uploads import (
+    SNIFF_LENGTH,
+    get_thumbnail_name,
+    sniff_image_type,
+)
 from authentication.models import Session, User
 
 
+# Columns of User loaded on login, for the password check, the tokens and
+# the user data of the response (see services.custom_login)
+LOGIN_USER_FIELDS = (
+    "id",
+    "password",
+    "is_active",
+    "email",
+    "phone",
+    "first_name",
+    "last_name",
+)
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 
@@ -22,29 +42,38 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         username = attrs.get("email", None)
         password = attrs.get("password", None)
 
-        # Check if the username is email or phone
-        user = None
-        if "@" in username:
-            user = User.objects.filter(email=username).first()
-        else:
-            user = User.objects.filter(phone=username).first()
-        
-        if user is None or not user.check_password(password):
+        # Check if the username is email or phone, both are unique so the
+        # lookup is a single index get loading only what login needs
+        lookup = "email" if "@" in username else "phone"
+        try:
+            user = User.objects.only(*LOGIN_USER_FIELDS).get(**{lookup: username})
+        except User.DoesNotExist:
+            # Run the password hasher once anyway, so response times do not
+            # tell unknown users apart from wrong passwords
+            User().set_password(password)
             raise serializers.ValidationError("Invalid login credentials.")
 
-         # Use the email or phone as the username_field value
-        username_value = user.email if user.email else user.phone
+        if not user.check_password(password) or not user.is_active:
+            raise serializers.ValidationError("Invalid login credentials.")
 
+        return {"user": user}
 
+    def create(self, validated_data):
+        """
+        Creates the session of this login and the tokens linked to it, so
+        logout and refresh can update it by primary key. Called by `save`
+        once the credentials are valid.
+        """
+        user = validated_data["user"]
+        session = services.create_session(self.context["request"], user)
         refresh = RefreshToken.for_user(user)
-        data = {
+        refresh["sid"] = session.pk
+        return {
             "refresh": str(refresh),
             "access": str(refresh.access_token),
+            # Include additional user details in the response
+            "user": user,
         }
-        # Include additional user details in the response
-        data["user"] = user
-
-        return data
 
 
 class EmailVerifySerializer(serializers.Serializer):
@@ -131,8 +160,12 @@ class UserSerializer(serializers.ModelSerializer):
         - `first_name`: The user's first name.
         - `last_name`: The user's last name.
         - `profile_picture`: The user's profile picture URL or file path.
+        - `profile_picture_thumbnails`: URLs of the picture's thumbnails by size (e.g. "64x64"),
+          generated in the background after an upload.
     """
 
+    profile_picture_thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = [
@@ -141,8 +174,21 @@ class UserSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "profile_picture",
+            "profile_picture_thumbnails",
         ]
 
+    def get_profile_picture_thumbnails(self, user):
+        if not user.profile_picture:
+            return {}
+        request = self.context.get("request")
+        thumbnails = {}
+        for size in settings.PROFILE_PICTURE_THUMBNAIL_SIZES:
+            url = default_storage.url(get_thumbnail_name(user.profile_picture.name, size))
+            thumbnails["%dx%d" % size] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return thumbnails
+
 
 class ProfilePictureSerializer(serializers.ModelSerializer):
     """
@@ -154,12 +200,16 @@ class ProfilePictureSerializer(serializers.ModelSerializer):
     Fields:
         - `profile_picture`: The user's profile picture.
 
+    validate_profile_picture method:
+        - Sniffs the leading bytes of the upload and rejects anything but JPEG, PNG, GIF and WebP images,
+          whatever its name or content type claims.
+
     update method:
         - Overridden to handle updating the user's profile picture.
         - Extracts the `profile_picture` field from the validated data.
-        - If the field is present, updates the user's profile_picture attribute.
+        - If the field is present, stores it content-addressed and updates only the user's
+          profile_picture column (see `services.save_profile_picture`).
         - Otherwise, keeps the existing picture.
-        - Saves the updated user instance.
         - Returns the updated user instance.
     """
 
@@ -167,6 +217,20 @@ class ProfilePictureSerializer(serializers.ModelSerializer):
         model = User
         fields = ["profile_picture"]
 
+    def validate_profile_picture(self, value):
+        image_type = getattr(value, "image_type", None)
+        if image_type is None:
+            # not streamed through SizeLimitedUploadHandler
+            value.seek(0)
+            image_type = sniff_image_type(value.read(SNIFF_LENGTH))
+            value.seek(0)
+            value.image_type = image_type
+        if image_type is None:
+            raise serializers.ValidationError(
+                "Upload a valid image, JPEG, PNG, GIF or WebP."
+            )
+        return value
+
     def update(self, instance, validated_data):
         """
         Updates the user's profile picture based on the provided data.
@@ -179,11 +243,12 @@ class ProfilePictureSerializer(serializers.ModelSerializer):
             The updated user instance.
         """
 
-        instance.profile_picture = validated_data.get(
-            "profile_picture", instance.profile_picture
+        profile_picture = validated_data.get("profile_picture")
+        if profile_picture is None:
+            return instance
+        return services.save_profile_picture(
+            instance, profile_picture, profile_picture.image_type
         )
-        instance.save()
-        return instance
 
 
 class SessionSerializer(serializers.ModelSerializer):
@@ -1,22 +1,138 @@
-import random, secrets, os
-from authentication.models import EmailPhoneVerification
+import random, secrets
 from datetime import timedelta
-from drf_template.settings import BASE_DIR
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
+from core.db_router import route_for_user, use_primary
 from core.mail import send_mail_func
 from core.sms import send_sms_func
-from authentication.models import Session, User
+from core.tasks import enqueue_on_commit
+from core.uploads import generate_thumbnails, save_content_addressed
+from authentication.models import Session, User, UserActivitySummary
+from authentication.otp_store import OTPNotFound, get_otp_store
+from authentication.session_activity import get_session_activity_buffer
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, F, Min
+from django.db.models.functions import Coalesce, Least
+
+
+def create_session(request, user):
+    """
+    Creates the session of a login, its id is embedded as the `sid` claim in
+    the tokens issued for it.
+
+    Args:
+        request (HttpRequest): The incoming login request object.
+        user (User): The user logging in.
+
+    Returns:
+        Session: The newly created session.
+    """
+    data = {
+        "start_time": timezone.now(),
+        "remote_address": request.META["REMOTE_ADDR"],
+        "login_method_id": 1,
+        "browser_info": request.data.get("browserInfo", None),
+        "ip_address": request.data.get("ipAddress", None),
+        "os_info": request.data.get("osInfo", None),
+        "timezone": request.data.get("timezone", None),
+        "location": request.data.get("location", None),
+        "device_id": request.data.get("deviceId", None),
+    }
+
+    # Create a new session object with user data and login information, the
+    # insert stays on the request as the tokens need its id. The user's next
+    # requests read it from the primary database, see core.db_router.
+    route_for_user(user.pk)
+    session = Session(user=user, **data)
+    session.save()
+
+    # Update the activity summary off the request
+    enqueue_on_commit(update_activity_summary, session)
+    return session
+
+
+def aggregate_activity(user_id):
+    """
+    Aggregates the activity summary fields of a user over all their
+    sessions, as read from the primary database: counts from a lagging
+    replica would miss the latest sessions.
+    """
+    with use_primary():
+        return Session.objects.filter(user_id=user_id).aggregate(
+            first_login=Min("start_time"),
+            distinct_device_count=Count("device_id", distinct=True),
+            total_sessions=Count("id"),
+        )
+
+
+def rebuild_activity_summary(user_id):
+    """
+    Recomputes the activity summary of a user from all their sessions.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        UserActivitySummary: The saved summary.
+    """
+    summary, _ = UserActivitySummary.objects.update_or_create(
+        user_id=user_id, defaults=aggregate_activity(user_id)
+    )
+    return summary
+
+
+def update_activity_summary(session):
+    """
+    Adds a newly created session to its user's activity summary with a
+    single UPDATE, the summary is rebuilt from the sessions if the user has
+    none yet.
+
+    Only this task and `backfill_activity_summary` save summaries, a summary
+    saved by anything else after the session was created would count it
+    twice. Two concurrent first logins from the same device may both count
+    it, `backfill_activity_summary` corrects such drift.
+
+    Args:
+        session (Session): The newly created session.
+    """
+    with use_primary():
+        is_new_device = bool(session.device_id) and not (
+            Session.objects.filter(
+                user_id=session.user_id, device_id=session.device_id
+            )
+            .exclude(pk=session.pk)
+            .exists()
+        )
+    updated = UserActivitySummary.objects.filter(user_id=session.user_id).update(
+        first_login=Coalesce(Least("first_login", session.start_time), session.start_time),
+        distinct_device_count=F("distinct_device_count") + int(is_new_device),
+        total_sessions=F("total_sessions") + 1,
+    )
+    if not updated:
+        rebuild_activity_summary(session.user_id)
+
+
+def get_activity_summary(user_id):
+    """
+    Returns the activity summary of a user. For users not covered by
+    `backfill_activity_summary` or `update_activity_summary` yet it is
+    aggregated from their sessions without being saved, see
+    `update_activity_summary`.
+    """
+    summary = UserActivitySummary.objects.filter(user_id=user_id).first()
+    if summary is None:
+        summary = UserActivitySummary(user_id=user_id, **aggregate_activity(user_id))
+    return summary
 
 
-@transaction.atomic
 def custom_login(request, response):
     """
-    Handles a custom login request, validates user credentials,
-    creates a session, and returns user data with permissions.
+    Handles a custom login request and returns user data with permissions.
+    The session is created when the view saves
+    `CustomTokenObtainPairSerializer`, see `create_session`.
 
     Args:
         request (HttpRequest): The incoming login request object.
@@ -25,32 +141,11 @@ def custom_login(request, response):
     Returns:
         HttpResponse: The modified response object with user data on success,
                        or with an error message otherwise (depending on response.status_code).
-
-    Raises:
-        MultipleExceptions (e.g., PermissionError, ValidationError):
-            May raise various exceptions depending on the login process.
     """
     if response.status_code == 200:
         # Login successful, proceed with user data population
-        data = {
-            "start_time": timezone.now(),
-            "remote_address": request.META["REMOTE_ADDR"],
-            "login_method_id": 1,
-            "browser_info": request.data.get("browserInfo", None),
-            "ip_address": request.data.get("ipAddress", None),
-            "os_info": request.data.get("osInfo", None),
-            "timezone": request.data.get("timezone", None),
-            "location": request.data.get("location", None),
-            "device_id": request.data.get("deviceId", None),
-        }
-
-        # Authenticate user based on email from request data
         user = response.data.get("user", None)
 
-        # Create a new session object with user data and login information
-        session = Session(user=user, **data)
-        session.save()
-
         # Prepare user data with ID, email, name, groups (including permissions)
         response.data["user"] = {
             "id": user.id,
@@ -62,12 +157,14 @@ def custom_login(request, response):
     return response
 
 
-@transaction.atomic
 def custom_logout(request):
     """
     Handles a custom logout request, checks for authentication,
     ends the user's session, and returns a success message.
 
+    The session is ended by primary key from the `sid` claim of the access
+    token, tokens issued without it end the user's latest session.
+
     Args:
         request (HttpRequest): The incoming logout request object.
 
@@ -81,33 +178,92 @@ def custom_logout(request):
 
     # Get the user object from the request
     user = request.user
+    session_id = request.auth.get("sid") if request.auth else None
 
-    # Find the latest session for the user (assuming sessions are ordered by start time)
-    session = Session.objects.filter(user_id=user).order_by("-start_time").first()
+    if session_id:
+        # End the session of this token with a single UPDATE
+        Session.objects.filter(pk=session_id).update(end_time=timezone.now())
+    else:
+        with transaction.atomic():
+            # Find the latest session for the user (assuming sessions are ordered by start time)
+            session = Session.objects.filter(user_id=user).order_by("-start_time").first()
 
-    # If a session is found, update its end_time to mark it as inactive
-    if session:
-        session.end_time = timezone.now()
-        session.save()
+            # If a session is found, update its end_time to mark it as inactive
+            if session:
+                session.end_time = timezone.now()
+                session.save()
 
     # Always return a success message with status code 200 OK,
     return Response({"detail": "Successfully logged out"}, status=status.HTTP_200_OK)
 
 
-@transaction.atomic
-def extend_session_end_time(user_id):
+def extend_session_end_time(user_id, session_id=None):
     """
-    Extends the end time of the latest session for the given user.
+    Extends the end time of a session, by primary key when the refresh token
+    carries its `sid` claim, otherwise the latest session for the given user.
+    With SESSION_WRITE_BEHIND the extension is buffered and written in a
+    later batch, see `SessionActivityBuffer`.
 
     Args:
         user_id (int): The ID of the user whose session to extend.
+        session_id (int, optional): The ID of the session to extend.
+    """
+    end_time = timezone.now() + timedelta(hours=1)
+    if settings.SESSION_WRITE_BEHIND:
+        get_session_activity_buffer().record(user_id, end_time, session_id=session_id)
+        return
+
+    if session_id:
+        Session.objects.filter(pk=session_id).update(end_time=end_time)
+        return
+
+    with transaction.atomic():
+        latest_session = (
+            Session.objects.filter(user_id=user_id).order_by("-start_time").first()
+        )
+        if latest_session:
+            latest_session.end_time = end_time
+            latest_session.save()
+
+
+def get_profile_etag(request):
+    """
+    ETag of the authenticated user's profile, changes whenever the user is
+    saved. Computed from request.user alone, no query is run.
+    """
+    user = request.user
+    return "%s-%s" % (user.pk, user.updated_at.timestamp())
+
+
+def get_profile_last_modified(request):
+    """
+    Last-Modified time of the authenticated user's profile.
+    """
+    return request.user.updated_at
+
+
+def save_profile_picture(user, uploaded_file, image_type):
     """
-    latest_session = (
-        Session.objects.filter(user_id=user_id).order_by("-start_time").first()
+    Stores an uploaded profile picture under its content hash, so the same
+    picture is stored once however often it is uploaded, and points the user
+    at it. Only the picture column (and updated_at) is written, thumbnails
+    are generated once the transaction commits.
+
+    Args:
+        user (User): The user whose picture to replace.
+        uploaded_file (UploadedFile): The validated upload.
+        image_type (str): File extension of the sniffed image format.
+
+    Returns:
+        User: The updated user.
+    """
+    name = save_content_addressed("profilepictures", uploaded_file, image_type)
+    user.profile_picture = name
+    user.save(update_fields=["profile_picture", "updated_at"])
+    enqueue_on_commit(
+        generate_thumbnails, name, settings.PROFILE_PICTURE_THUMBNAIL_SIZES
     )
-    if latest_session:
-        latest_session.end_time = timezone.now() + timedelta(hours=1)
-        latest_session.save()
+    return user
 
 
 @transaction.atomic
@@ -115,22 +271,16 @@ def generate_email_otp(email):
 
     # Generate a 6-digit OTP
     otp = str(random.randint(100000, 999999))
-    expiry_time = timezone.now() + timedelta(minutes=5)
 
-    # Create or update EmailVerification entry
-    obj, created = EmailPhoneVerification.objects.update_or_create(
-        email=email,
-        defaults={"otp": otp, "otp_expiry": expiry_time, "is_verified": False},
-    )
-    template = os.path.join(
-        BASE_DIR, "core", "templates", "otp.html"
-    )  # Email template path
+    # Store the OTP, it expires after OTP_TTL seconds
+    get_otp_store().set_otp(otp, email=email)
 
-    # Send the OTP via email
-    send_mail_func(
+    # Send the OTP via email once the transaction commits, off the request
+    enqueue_on_commit(
+        send_mail_func,
         to=[email],
         subject="Your OTP for Email Verification",
-        template=template,
+        template="otp",  # precompiled in CoreConfig.ready
         otp=otp,
     )
 
@@ -142,16 +292,13 @@ def generate_phone_otp(phone):
 
     # Generate a 6-digit OTP
     otp = str(random.randint(100000, 999999))
-    expiry_time = timezone.now() + timedelta(minutes=5)
 
-    # Create or update EmailVerification entry
-    obj, created = EmailPhoneVerification.objects.update_or_create(
-        phone=phone,
-        defaults={"otp": otp, "otp_expiry": expiry_time, "is_verified": False},
-    )
+    # Store the OTP, it expires after OTP_TTL seconds
+    get_otp_store().set_otp(otp, phone=phone)
 
-    # Send the OTP via email
-    send_sms_func(
+    # Send the OTP via SMS once the transaction commits, off the request
+    enqueue_on_commit(
+        send_sms_func,
         phone_number=phone,
         body=f"Your OTP is {otp}",
     )
@@ -161,33 +308,25 @@ def generate_phone_otp(phone):
 
 @transaction.atomic
 def verify_email_otp(otp, email=None, phone=None):
-    if email:
-        try:
-            verification = EmailPhoneVerification.objects.get(email=email)
-        except EmailPhoneVerification.DoesNotExist:
-            raise ValidationError({"error": "Invalid OTP."})
-    elif phone:
-        try:
-            verification = EmailPhoneVerification.objects.get(phone=phone)
-        except EmailPhoneVerification.DoesNotExist:
-            raise ValidationError({"error": "Invalid OTP or phone number."})
-    else:
+    if not email and not phone:
         raise ValidationError({"error": "Either email or phone must be provided."})
 
-    if not verification.is_otp_valid(otp):
-        raise ValidationError({"error": "Invalid or expired OTP."})
+    otp_store = get_otp_store()
+    try:
+        is_valid = otp_store.check_otp(otp, email=email, phone=phone)
+    except OTPNotFound:
+        if email:
+            raise ValidationError({"error": "Invalid OTP."})
+        raise ValidationError({"error": "Invalid OTP or phone number."})
 
-    # Mark the email as verified
-    # verification.is_verified = True
-    verification.save()
+    if not is_valid:
+        raise ValidationError({"error": "Invalid or expired OTP."})
 
     # Generate a temporary token
     temp_token = secrets.token_urlsafe(32)
 
-    # Store the token in the database
-    verification.temp_token = temp_token
-    verification.temp_token_expiry = timezone.now() + timedelta(minutes=10)
-    verification.save()
+    # Store the token, it expires after OTP_TEMP_TOKEN_TTL seconds
+    otp_store.set_temp_token(temp_token, email=email, phone=phone)
 
     return Response({"message": "Email verified successfully.", "token": temp_token})
 
@@ -207,20 +346,15 @@ def validate_and_register_user(validated_data, token):
     email = validated_data.get("email", None)
     phone = validated_data.get("phone", None)
 
+    otp_store = get_otp_store()
     try:
-        if email:
-            verification = EmailPhoneVerification.objects.get(email=email)
-        elif phone:
-            verification = EmailPhoneVerification.objects.get(phone=phone)
-
         # Check if the token is valid
-        if not verification.is_temp_token_valid(token):
+        if not otp_store.check_temp_token(token, email=email, phone=phone):
             raise ValidationError({"token": "Invalid or expired token."})
-    except EmailPhoneVerification.DoesNotExist:
+    except OTPNotFound:
         raise ValidationError(
             {"detail": "Verification record not found for the provided email/phone."}
         )
 
     # Optionally, clean up the token
-    verification.temp_token = None
-    verification.save()
+    otp_store.clear_temp_token(email=email, phone=phone)
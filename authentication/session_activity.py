@@ -0,0 +1,107 @@
+import atexit
+import logging
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import OuterRef, Subquery
+
+from authentication.models import Session
+
+logger = logging.getLogger(__name__)
+
+
+class SessionActivityBuffer:
+    """
+    Write-behind buffer for session end time extensions.
+
+    Extensions are recorded in memory and written to the database in one
+    batch every `interval` seconds. Repeated extensions of the same session
+    coalesce into a single update keeping the latest end time.
+    """
+
+    def __init__(self, interval=5):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending_by_session = {}
+        self.pending_by_user = {}
+        self.timer = None
+
+    def record(self, user_id, end_time, session_id=None):
+        """
+        Records that the session was extended to end_time, the latest session
+        of the user when session_id is not known.
+        """
+        with self.lock:
+            if session_id:
+                pending, key = self.pending_by_session, session_id
+            else:
+                pending, key = self.pending_by_user, user_id
+            current = pending.get(key)
+            if current is None or end_time > current:
+                pending[key] = end_time
+            if self.timer is None:
+                self.timer = threading.Timer(self.interval, self.flush_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """
+        Writes all pending extensions with a single bulk update. Sessions only
+        known by their user are resolved with one extra query.
+
+        Returns:
+            int: Number of sessions updated.
+        """
+        with self.lock:
+            pending_by_session, self.pending_by_session = self.pending_by_session, {}
+            pending_by_user, self.pending_by_user = self.pending_by_user, {}
+            self.timer = None
+        if not pending_by_session and not pending_by_user:
+            return 0
+
+        try:
+            sessions = [
+                Session(pk=session_id, end_time=end_time)
+                for session_id, end_time in pending_by_session.items()
+            ]
+            if pending_by_user:
+                latest_session_id = (
+                    Session.objects.filter(user_id=OuterRef("user_id"))
+                    .order_by("-start_time")
+                    .values("id")[:1]
+                )
+                for session in Session.objects.filter(
+                    user_id__in=pending_by_user, id=Subquery(latest_session_id)
+                ).only("id", "user_id"):
+                    if session.pk not in pending_by_session:
+                        session.end_time = pending_by_user[session.user_id]
+                        sessions.append(session)
+            Session.objects.bulk_update(sessions, fields=["end_time"])
+        except Exception:
+            logger.exception("Flushing session activity failed, retrying later")
+            for session_id, end_time in pending_by_session.items():
+                self.record(None, end_time, session_id=session_id)
+            for user_id, end_time in pending_by_user.items():
+                self.record(user_id, end_time)
+            return 0
+        return len(sessions)
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # database connections are per thread, don't leak the timer's
+            connections.close_all()
+
+
+@lru_cache(maxsize=None)
+def get_session_activity_buffer():
+    """
+    Returns the process-wide session activity buffer, flushed one last time
+    when the process exits.
+    """
+    buffer = SessionActivityBuffer(interval=settings.SESSION_WRITE_BEHIND_INTERVAL)
+    atexit.register(buffer.flush)
+    return buffer
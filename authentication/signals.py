@@ -0,0 +1,34 @@
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from authentication.authentication import invalidate_cached_user
+from authentication.models import User
+from authentication.permissions import bump_permission_version
+from softdelete.signals import post_soft_delete_batch
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_on_change(sender, instance, **kwargs):
+    # covers password changes too, set_password() is followed by save()
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_soft_delete_batch, sender=User)
+def invalidate_users_on_soft_delete(sender, instances, **kwargs):
+    for instance in instances:
+        invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions_on_change(sender, **kwargs):
+    # cached permissions of GroupPermission
+    if kwargs.get("action", "post_").startswith("post_"):
+        bump_permission_version()
@@ -1,3 +1,590 @@
-from django.test import TestCase
+import io
+import re
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from authentication import services
+from authentication.authentication import CachedJWTAuthentication, get_user_cache_key
+from authentication.checks import check_otp_cache_is_shared
+from authentication.models import Session, User, UserActivitySummary
+from authentication.otp_store import (
+    CacheOTPStore,
+    DatabaseOTPStore,
+    OTPNotFound,
+    get_otp_store,
+)
+from authentication.permissions import GroupPermission
+from authentication.serializers import LOGIN_USER_FIELDS
+from authentication.session_activity import (
+    SessionActivityBuffer,
+    get_session_activity_buffer,
+)
+from core.tasks import get_task_backend
+from core.uploads import get_thumbnail_name
+
+# Plan fragments showing a query sorts rows or reads the whole Session table
+# instead of using its (user, start_time) / (user, device_id) indexes.
+FULL_SCAN_OR_SORT = {
+    "sqlite": [r"USE TEMP B-TREE", r"\bSCAN Session\b"],
+    "postgresql": [r"\bSort\b", r"\bSeq Scan on \"?Session\"?"],
+}
+
+
+class SessionQueryPlanTests(TestCase):
+    """
+    Query plan regression tests for the hot Session queries of logout, token
+    refresh and the recent activity endpoint.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="plan@example.com", password="x")
+        other_user = User.objects.create_user(email="other@example.com", password="x")
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(
+                user=user,
+                start_time=now - timedelta(minutes=i),
+                end_time=now,
+                device_id="device-%d" % (i % 3),
+            )
+            for user in (cls.user, other_user)
+            for i in range(50)
+        )
+        # the endpoint reads the summaries, as after backfill_activity_summary
+        for user in (cls.user, other_user):
+            services.rebuild_activity_summary(user.id)
+
+    def setUp(self):
+        if connection.vendor not in FULL_SCAN_OR_SORT:
+            self.skipTest("No plan markers for %s" % connection.vendor)
+        if connection.vendor == "postgresql":
+            # tiny tables are always cheaper to scan, make the planner use
+            # an index whenever one applies
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSessionQueriesUseIndexes(self, func):
+        with CaptureQueriesContext(connection) as context:
+            func()
+
+        session_selects = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT") and '"Session"' in query["sql"]
+        ]
+        self.assertTrue(session_selects, "No Session query was run")
+        for sql in session_selects:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "%s %s" % (connection.ops.explain_query_prefix(), sql)
+                )
+                plan = "\n".join(
+                    " ".join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                )
+            for marker in FULL_SCAN_OR_SORT[connection.vendor]:
+                self.assertIsNone(
+                    re.search(marker, plan),
+                    "Query falls back to a sort or scan:\n%s\n%s" % (sql, plan),
+                )
+
+    def test_extend_session_end_time(self):
+        self.assertSessionQueriesUseIndexes(
+            lambda: services.extend_session_end_time(self.user.id)
+        )
+
+    def test_logout(self):
+        self.assertSessionQueriesUseIndexes(
+            lambda: self.client.get(reverse("logout"))
+        )
+
+    def test_recent_activity(self):
+        next_page = self.client.get(reverse("profile-recent-activity")).data["next"]
+        self.assertSessionQueriesUseIndexes(lambda: self.client.get(next_page))
+
+
+class RecentActivityPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="pages@example.com", password="x")
+        sessions = Session.objects.bulk_create(
+            Session(user=cls.user, end_time=timezone.now()) for _ in range(25)
+        )
+        # ties on start_time are broken by id
+        start_time = timezone.now()
+        Session.objects.filter(pk__in=[s.pk for s in sessions[:10]]).update(
+            start_time=start_time
+        )
+        services.rebuild_activity_summary(cls.user.id)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_every_session_once(self):
+        expected = list(
+            Session.objects.filter(user=self.user)
+            .order_by("-start_time", "-id")
+            .values_list("id", flat=True)
+        )
+        pages = []
+        url = reverse("profile-recent-activity") + "?size=10"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.data["count"], 25)
+            pages.append(response.data)
+            url = response.data["next"]
+
+        self.assertEqual(
+            [session["id"] for page in pages for session in page["results"]],
+            expected,
+        )
+        self.assertIsNone(pages[0]["previous"])
+        previous = self.client.get(pages[2]["previous"]).data
+        self.assertEqual(previous["results"], pages[1]["results"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("profile-recent-activity"), {"cursor": "x"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_pagination_is_kept_for_page_param(self):
+        first_page = self.client.get(reverse("profile-recent-activity")).data
+        response = self.client.get(reverse("profile-recent-activity"), {"page": 1})
+        self.assertEqual(
+            list(response.data),
+            ["count", "next", "previous", "results", "distinct_device_count", "first_login"],
+        )
+        self.assertEqual(list(first_page), list(response.data))
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(response.data["results"], first_page["results"])
+        self.assertIn("page=2", response.data["next"])
+
+
+class GroupPermissionTests(TestCase):
+    class SessionView(APIView):
+        app_model = ("authentication", "session")
+        permission_classes = [GroupPermission]
+
+        def get(self, request):
+            return Response()
+
+    def request(self, method, user):
+        request = getattr(APIRequestFactory(), method)("/")
+        force_authenticate(request, user)
+        return self.SessionView.as_view()(request).status_code
+
+    def test_superuser_is_allowed_any_method(self):
+        user = User.objects.create_superuser(email="admin@example.com", password="x")
+        for method in ("get", "head", "options"):
+            self.assertEqual(self.request(method, user), 200, method)
+
+    def test_methods_without_permission_are_denied(self):
+        user = User.objects.create_user(email="user@example.com", password="x")
+        for method in ("get", "options"):
+            self.assertEqual(self.request(method, user), 403, method)
+
+
+@override_settings(JWT_USER_CACHE_TTL=60)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="cached@example.com", password="x")
+        self.token = AccessToken.for_user(self.user)
+        self.authentication = CachedJWTAuthentication()
+        caches["default"].clear()
+
+    def test_user_is_cached_without_password_hash(self):
+        self.authentication.get_user(self.token)
+        with self.assertNumQueries(0):
+            user = self.authentication.get_user(self.token)
+        self.assertEqual(user.email, self.user.email)
+        self.assertIn("password", user.get_deferred_fields())
+        self.assertNotIn(
+            self.user.password, repr(caches["default"].get(get_user_cache_key(self.user.pk)))
+        )
+
+    def test_saving_cached_user_keeps_password(self):
+        self.authentication.get_user(self.token)
+        user = self.authentication.get_user(self.token)
+        user.first_name = "Cached"
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Cached")
+        self.assertTrue(self.user.check_password("x"))
+
+
+class OTPStoreTests(TestCase):
+    stores = [DatabaseOTPStore, CacheOTPStore]
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def check(self, method, value, **lookup):
+        """result of the check method, False when nothing is stored"""
+        try:
+            return method(value, **lookup)
+        except OTPNotFound:
+            return False
+
+    def test_otp(self):
+        for store_class in self.stores:
+            with self.subTest(store_class.__name__):
+                store = store_class()
+                with self.assertRaises(OTPNotFound):
+                    store.check_otp("123456", email="otp@example.com")
+                store.set_otp("123456", email="otp@example.com")
+                self.assertTrue(store.check_otp("123456", email="otp@example.com"))
+                self.assertFalse(store.check_otp("654321", email="otp@example.com"))
+                # stored per email/phone
+                store.set_otp("111111", phone="+15550000000")
+                self.assertTrue(store.check_otp("111111", phone="+15550000000"))
+                self.assertTrue(store.check_otp("123456", email="otp@example.com"))
+
+    @override_settings(OTP_TTL=0, OTP_TEMP_TOKEN_TTL=0)
+    def test_expiry(self):
+        for store_class in self.stores:
+            with self.subTest(store_class.__name__):
+                store = store_class()
+                store.set_otp("123456", email="expired@example.com")
+                store.set_temp_token("token", email="expired@example.com")
+                self.assertFalse(
+                    self.check(store.check_otp, "123456", email="expired@example.com")
+                )
+                self.assertFalse(
+                    self.check(store.check_temp_token, "token", email="expired@example.com")
+                )
+
+    def test_temp_token_is_single_use(self):
+        for store_class in self.stores:
+            with self.subTest(store_class.__name__):
+                store = store_class()
+                store.set_otp("123456", phone="+15551111111")
+                store.set_temp_token("token", phone="+15551111111")
+                self.assertFalse(store.check_temp_token(None, phone="+15551111111"))
+                self.assertFalse(store.check_temp_token("other", phone="+15551111111"))
+                self.assertTrue(store.check_temp_token("token", phone="+15551111111"))
+                store.clear_temp_token(phone="+15551111111")
+                self.assertFalse(
+                    self.check(store.check_temp_token, "token", phone="+15551111111")
+                )
+
+    @override_settings(OTP_STORE="authentication.otp_store.CacheOTPStore")
+    def test_cache_store_needs_shared_cache(self):
+        self.assertIsInstance(get_otp_store(), CacheOTPStore)
+        self.assertEqual(
+            [error.id for error in check_otp_cache_is_shared(None)],
+            ["authentication.E002"],
+        )
+        with override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": "/tmp/otp-check",
+                }
+            }
+        ):
+            self.assertEqual(check_otp_cache_is_shared(None), [])
+
+
+class ActivitySummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="summary@example.com", password="x")
+        self.start = timezone.now()
+
+    def login(self, device_id, minutes=0):
+        """a session as created by a login, before its summary update"""
+        session = Session.objects.create(
+            user=self.user, end_time=self.start, device_id=device_id
+        )
+        # start_time is set on insert
+        session.start_time = self.start + timedelta(minutes=minutes)
+        Session.objects.filter(pk=session.pk).update(start_time=session.start_time)
+        return session
+
+    def summary(self):
+        summary = UserActivitySummary.objects.get(user=self.user)
+        return summary.total_sessions, summary.distinct_device_count, summary.first_login
+
+    def test_updates(self):
+        services.update_activity_summary(self.login("a", minutes=1))
+        self.assertEqual(self.summary(), (1, 1, self.start + timedelta(minutes=1)))
+        services.update_activity_summary(self.login("a"))
+        services.update_activity_summary(self.login("b", minutes=2))
+        services.update_activity_summary(self.login(None, minutes=3))
+        self.assertEqual(self.summary(), (4, 2, self.start))
+
+    def test_read_before_update_is_not_counted_twice(self):
+        session = self.login("a")
+        # the recent activity endpoint reads the summary before the task ran
+        summary = services.get_activity_summary(self.user.id)
+        self.assertEqual(summary.total_sessions, 1)
+        self.assertFalse(UserActivitySummary.objects.filter(user=self.user).exists())
+
+        services.update_activity_summary(session)
+        self.assertEqual(self.summary(), (1, 1, self.start))
+
+    @override_settings(DATABASE_REPLICAS=["missing-replica"])
+    def test_reads_go_to_primary(self):
+        services.update_activity_summary(self.login("a"))
+        session = self.login("a")
+        # outside a transaction, a read routed to the (missing) replica
+        # would fail
+        with mock.patch.object(connection, "in_atomic_block", False):
+            services.update_activity_summary(session)
+        self.assertEqual(self.summary(), (2, 1, self.start))
+
+
+@override_settings(SESSION_WRITE_BEHIND=False)
+class LoginSessionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="login@example.com", password="x")
+        self.client = APIClient()
+
+    def login(self, password="x"):
+        return self.client.post(
+            reverse("custom_token_obtain_pair"),
+            {"email": "login@example.com", "password": password, "deviceId": "phone"},
+            format="json",
+        )
+
+    def test_tokens_carry_the_session_of_the_login(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        session = Session.objects.get(user=self.user)
+        self.assertEqual(session.device_id, "phone")
+        self.assertEqual(RefreshToken(response.data["refresh"])["sid"], session.pk)
+        self.assertEqual(AccessToken(response.data["access"])["sid"], session.pk)
+        self.assertEqual(response.data["user"]["email"], "login@example.com")
+
+    def test_invalid_credentials_create_no_session(self):
+        self.assertEqual(self.login(password="wrong").status_code, 400)
+        self.assertFalse(Session.objects.exists())
+
+    def test_login_loads_only_login_fields(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.login().status_code, 200)
+        queries = [
+            query["sql"] for query in context.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertEqual(len(queries), 2)
+        user_query, session_insert = queries
+        selected = re.findall(r'"User"\."(\w+)"', user_query.split(" FROM ")[0])
+        self.assertEqual(sorted(selected), sorted(LOGIN_USER_FIELDS))
+        self.assertTrue(session_insert.startswith('INSERT INTO "Session"'))
+
+    def test_unknown_user_still_hashes_password(self):
+        with mock.patch.object(User, "set_password", autospec=True) as set_password:
+            self.client.post(
+                reverse("custom_token_obtain_pair"),
+                {"email": "unknown@example.com", "password": "x"},
+                format="json",
+            )
+            set_password.assert_called_once_with(mock.ANY, "x")
+            self.assertEqual(self.login(password="wrong").status_code, 400)
+            # a known user is checked with its own hash instead
+            set_password.assert_called_once()
+
+    def test_logout_and_refresh_update_the_session_of_the_tokens(self):
+        tokens = self.login().data
+        session = Session.objects.get(user=self.user)
+        # a later login, the latest session of the user
+        self.login()
+        later_session = Session.objects.exclude(pk=session.pk).get()
+        end_time = later_session.end_time
+
+        response = self.client.post(
+            reverse("token_refresh"), {"refresh": tokens["refresh"]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        session.refresh_from_db()
+        self.assertGreater(session.end_time, session.start_time + timedelta(minutes=59))
+
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer %s" % tokens["access"])
+        self.client.get(reverse("logout"))
+        session.refresh_from_db()
+        self.assertLess(session.end_time, session.start_time + timedelta(minutes=1))
+        later_session.refresh_from_db()
+        self.assertEqual(later_session.end_time, end_time)
+
+
+@override_settings(
+    PROFILE_PICTURE_MAX_SIZE=10 * 1024, TASK_BACKEND="core.tasks.LocmemTaskBackend"
+)
+class ProfilePictureUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user(email="picture@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content, name="picture.png"):
+        return self.client.patch(
+            reverse("profile-update-profile-picture"),
+            {"profile_picture": SimpleUploadedFile(name, content)},
+            format="multipart",
+        )
+
+    def test_upload(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, format="GIF")
+        # the name does not matter, the content is sniffed
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(buffer.getvalue())
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        name = self.user.profile_picture.name
+        self.assertTrue(name.endswith(".gif"))
+
+        get_task_backend().run_pending()
+        for size in settings.PROFILE_PICTURE_THUMBNAIL_SIZES:
+            self.assertTrue(default_storage.exists(get_thumbnail_name(name, size)))
+
+    def test_rejects_non_images(self):
+        response = self.upload(b"<svg onload='alert(1)'></svg>")
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_too_large_files(self):
+        response = self.upload(b"\x89PNG\r\n\x1a\n" + b"x" * 10 * 1024)
+        self.assertEqual(response.status_code, 413)
+
+
+class SessionActivityBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="buffer@example.com", password="x")
+        self.start = timezone.now()
+        self.sessions = Session.objects.bulk_create(
+            Session(
+                user=self.user,
+                start_time=self.start + timedelta(minutes=i),
+                end_time=self.start,
+            )
+            for i in range(2)
+        )
+        self.buffer = self.make_buffer(interval=60)
+
+    def make_buffer(self, interval):
+        buffer = SessionActivityBuffer(interval=interval)
+
+        def cancel_timer():
+            if buffer.timer is not None:
+                buffer.timer.cancel()
+
+        self.addCleanup(cancel_timer)
+        return buffer
+
+    def end_times(self):
+        return [
+            session.end_time
+            for session in Session.objects.filter(user=self.user).order_by("start_time")
+        ]
+
+    def test_extensions_coalesce(self):
+        first, latest = self.sessions
+        hour = timedelta(hours=1)
+        self.buffer.record(self.user.id, self.start + 2 * hour, session_id=first.pk)
+        self.buffer.record(self.user.id, self.start + 3 * hour, session_id=first.pk)
+        self.buffer.record(self.user.id, self.start + hour, session_id=first.pk)
+        # resolved to the latest session of the user
+        self.buffer.record(self.user.id, self.start + hour)
+        self.buffer.record(self.user.id, self.start + 2 * hour)
+        self.assertEqual(len(self.buffer.pending_by_session), 1)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.end_times(), [self.start + 3 * hour, self.start + 2 * hour])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_timer_flushes(self):
+        buffer = self.make_buffer(interval=0.01)
+        flushed = threading.Event()
+        buffer.flush = flushed.set
+        buffer.record(self.user.id, self.start)
+        self.assertTrue(flushed.wait(5))
+
+    def test_failed_flush_records_again(self):
+        end_time = self.start + timedelta(hours=1)
+        self.buffer.record(self.user.id, end_time, session_id=self.sessions[0].pk)
+        self.buffer.record(self.user.id, end_time)
+        with mock.patch.object(
+            Session.objects, "bulk_update", side_effect=DatabaseError
+        ), self.assertLogs("authentication.session_activity", "ERROR"):
+            self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(self.buffer.pending_by_session, {self.sessions[0].pk: end_time})
+        self.assertEqual(self.buffer.pending_by_user, {self.user.id: end_time})
+        self.assertIsNotNone(self.buffer.timer)
+        self.assertEqual(self.buffer.flush(), 2)
+
+    def test_flushed_at_exit(self):
+        get_session_activity_buffer.cache_clear()
+        self.addCleanup(get_session_activity_buffer.cache_clear)
+        with mock.patch("authentication.session_activity.atexit.register") as register:
+            buffer = get_session_activity_buffer()
+        register.assert_called_once_with(buffer.flush)
+
+
+@override_settings(JWT_USER_CACHE_TTL=60)
+class ProfileTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user(email="profile@example.com", password="x")
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s" % AccessToken.for_user(self.user)
+        )
+
+    def test_unchanged_profile_is_not_modified(self):
+        response = self.client.get(reverse("profile-me"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["email"], self.user.email)
+        etag = response["ETag"]
+
+        response = self.client.get(reverse("profile-me"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        response = self.client.get(
+            reverse("profile-me"), HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_after_update(self):
+        etag = self.client.get(reverse("profile-me"))["ETag"]
+        self.user.first_name = "Updated"
+        self.user.save()
+
+        response = self.client.get(reverse("profile-me"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["first_name"], "Updated")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_serializes_authenticated_user(self):
+        self.client.get(reverse("profile"))
+        # the user comes from the authentication cache
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("profile"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user["email"] for user in response.data], [self.user.email])
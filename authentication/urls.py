@@ -16,6 +16,7 @@ urlpatterns = [
 
     # User Profile and Activity
     path('profile/', views.ProfileListAPIView.as_view(), name='profile'),
+    path('profile/me', views.ProfileRetrieveAPIView.as_view(), name='profile-me'),
     path('profile/update-profile-picture', views.ProfilePictureUpdateAPIView.as_view(), name='profile-update-profile-picture'),
     path('profile/recent-activity', views.RecentActivityListAPIView.as_view(), name='profile-recent-activity'),
     
@@ -1,12 +1,24 @@
-from django.db.models import Min
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework.generics import (
     ListAPIView,
     CreateAPIView,
+    RetrieveAPIView,
     UpdateAPIView,
 )
+from rest_framework import status
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
+from core.custom_pagination import EstimatedCountKeysetPagination
+from core.db_router import route_for_user, use_primary
+from core.uploads import SizeLimitedUploadHandler
 from core.mixins import PublicAPIMixin
 from master.serializers import StatusCodeSerializer
 from rest_framework_simplejwt.views import (
@@ -25,11 +37,9 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
     Inherits from `TokenObtainPairView` to provide base functionality for obtaining access tokens.
     Uses a custom serializer `CustomTokenObtainPairSerializer` for additional validation and data processing.
-    Overrides the `post` method to call the `custom_login` service, which likely handles:
-        - Session creation
-        - User data updates
-        - Custom claim addition to the token
-        - Response modification
+    Overrides the `post` method to create the session of the login once the
+    credentials are validated (see `CustomTokenObtainPairSerializer.create`)
+    and to call the `custom_login` service, which adds the user data to the response.
     """
 
     serializer_class = serializers.CustomTokenObtainPairSerializer
@@ -38,12 +48,22 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         """
         Handles the POST request to obtain a token.
 
-        Calls the parent class's `post` method to get the initial response.
+        Validates the credentials, then saves the serializer to create the session
+        and the tokens linked to it.
         Passes the request and response to the `custom_login` service for further processing.
         Returns the modified response from the service.
+
+        Reads go to the primary database, so users who just registered or
+        changed their password are not looked up on a lagging replica.
         """
-        response = super().post(request, *args, **kwargs)
-        return services.custom_login(request, response)
+        with use_primary():
+            serializer = self.get_serializer(data=request.data)
+            try:
+                serializer.is_valid(raise_exception=True)
+            except TokenError as e:
+                raise InvalidToken(e.args[0])
+            response = Response(serializer.save(), status=status.HTTP_200_OK)
+            return services.custom_login(request, response)
 
 
 @extend_schema(description=api_descriptions.CUSTOM_LOGOUT_DESCRIPTION)
@@ -106,10 +126,10 @@ class CustomTokenRefreshView(TokenRefreshView):
         Checks the response status code (200 indicates successful refresh).
         If refresh is successful:
 
-            - Extracts the user ID from the decoded refresh token using `RefreshToken`.
+            - Extracts the user ID and session ID (`sid` claim) from the decoded refresh token using `RefreshToken`.
 
-            - Calls `services.extend_session_end_time(user_id)` to potentially extend the session
-              end time for the user (implementation details in `services`).
+            - Calls `services.extend_session_end_time(user_id, session_id)` to extend the session
+              end time (implementation details in `services`).
 
             - Catches exceptions (e.g., invalid token) but doesn't explicitly handle them.
 
@@ -124,7 +144,10 @@ class CustomTokenRefreshView(TokenRefreshView):
                 try:
                     token = RefreshToken(refresh_token)
                     user_id = token["user_id"]
-                    services.extend_session_end_time(user_id)
+                    route_for_user(user_id)
+                    services.extend_session_end_time(
+                        user_id, session_id=token.get("sid")
+                    )
                 except Exception as e:
                     # Handle exceptions (e.g., invalid token)
                     pass
@@ -209,6 +232,42 @@ class ProfileListAPIView(ListAPIView):
         """
         return models.User.objects.filter(id=self.request.user.id)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Serializes the authenticated user itself, already loaded (and usually
+        cached) by the authentication class, instead of querying it again.
+        `get_queryset` is not used, so overriding it does not change the
+        response.
+        """
+        serializer = self.get_serializer([request.user], many=True)
+        return Response(serializer.data)
+
+
+@method_decorator(
+    condition(
+        etag_func=services.get_profile_etag,
+        last_modified_func=services.get_profile_last_modified,
+    ),
+    name="get",
+)
+@method_decorator(cache_control(private=True, no_cache=True), name="get")
+@extend_schema(description=api_descriptions.PROFILE_RETRIEVE_DESCRIPTION)
+class ProfileRetrieveAPIView(RetrieveAPIView):
+    """
+    View for retrieving the authenticated user's profile as a single object.
+
+    Serializes `request.user` as loaded by the authentication class, so no query is run for it.
+    Supports conditional GET: the ETag and Last-Modified headers are derived from `updated_at`
+    (see `services.get_profile_etag`), and a matching `If-None-Match` or `If-Modified-Since`
+    gets a `304 Not Modified` before anything is serialized.
+    """
+
+    serializer_class = serializers.UserSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        return self.request.user
+
 
 @extend_schema_view(
     patch=extend_schema(
@@ -256,10 +315,32 @@ class ProfilePictureUpdateAPIView(UpdateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = serializers.ProfilePictureSerializer
 
+    def initial(self, request, *args, **kwargs):
+        """
+        Streams the upload through `SizeLimitedUploadHandler` once the user is authenticated,
+        before the body is parsed, so oversized pictures are rejected while they are read.
+        """
+        super().initial(request, *args, **kwargs)
+        request._request.upload_handlers = [
+            SizeLimitedUploadHandler(
+                request._request, max_size=settings.PROFILE_PICTURE_MAX_SIZE
+            )
+        ]
+
     def get_object(self):
         return self.request.user
 
 
+class RecentActivityPagination(EstimatedCountKeysetPagination):
+    """
+    Keyset pagination keeping the "count" field of the page number
+    pagination the recent activity endpoint used before, filled with the
+    estimated count.
+    """
+
+    count_field = "count"
+
+
 @extend_schema(description=api_descriptions.RECENT_ACTIVITY_LIST_DESCRIPTION)
 class RecentActivityListAPIView(ListAPIView):
     """
@@ -267,60 +348,64 @@ class RecentActivityListAPIView(ListAPIView):
 
     Inherits from `ListAPIView` to leverage its functionality for retrieving and listing data.
     Sets `serializer_class` to `serializers.SessionSerializer` to serialize session data.
+    Paginates with a keyset cursor on (start_time, id), so deep pages cost the same as the
+    first and no COUNT query is run; the count is the summary's total sessions.
+    Requests with a `page` query parameter, from clients of the page number pagination
+    used before, are still paginated that way.
 
     """
 
     serializer_class = serializers.SessionSerializer
+    pagination_class = RecentActivityPagination
+    page_number_pagination_class = PageNumberPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and (
+            self.page_number_pagination_class.page_query_param in self.request.query_params
+        ):
+            self._paginator = self.page_number_pagination_class()
+        return super().paginator
 
     def get_queryset(self):
         """
         Customizes the queryset to retrieve the current user's recent login sessions.
         Filters sessions by user ID to match the currently authenticated user's ID (`self.request.user.id`).
         Selects related data from the "user" field using `select_related`.
-        Orders sessions by start time in descending order (`-start_time`) to show the most recent first.
+        Orders sessions by start time in descending order (`-start_time`) to show the most recent first,
+        ties broken by id so pages do not overlap.
         Returns the queryset containing the user's recent login sessions.
         """
 
         queryset = (
             models.Session.objects.select_related("user")
             .filter(user_id=self.request.user.id)
-            .order_by("-start_time")
+            .order_by("-start_time", "-id")
         )
         return queryset
 
+    @cached_property
+    def activity_summary(self):
+        return services.get_activity_summary(self.request.user.id)
+
+    def get_estimated_count(self, queryset):
+        """
+        Returns the number of sessions of the current user from their activity summary.
+        """
+        return self.activity_summary.total_sessions
+
     def list(self, request, *args, **kwargs):
         """
         Processes the request, retrieves sessions, and adds additional data to the response.
         Calls the parent class's `list` method to retrieve the list of sessions using the custom queryset.
-        Extracts the current user's ID from the request.
-        Calculates the number of distinct devices used for logins:
-            - Filters sessions for the current user with non-null device IDs (`device_id__isnull=False`).
-            - Uses `.values("device_id")` to select only the "device_id" field.
-            - Applies `.distinct()` to remove duplicates.
-            - Counts the number of distinct devices using `.count()`.
-        Finds the time of the first login:
-            - Filters sessions for the current user.
-            - Uses `.aggregate(first_login=Min("start_time"))` to get the minimum start time.
-            - Extracts the "first_login" value from the aggregated result.
-        Adds the calculated data ("distinct_device_count" and "first_login") to the response data.
+        Reads the number of distinct devices used for logins and the time of the first login
+        from the user's `UserActivitySummary`, maintained as sessions are created
+        (see `services.update_activity_summary`), instead of aggregating over all their sessions.
+        Adds the data ("distinct_device_count" and "first_login") to the response data.
         Returns the modified response object.
         """
 
         response = super().list(request, *args, **kwargs)
-        user_id = self.request.user.id
-        distinct_devices_count = (
-            models.Session.objects.filter(user_id=user_id, device_id__isnull=False)
-            .values("device_id")
-            .distinct()
-            .count()
-        )
-
-        first_login = (
-            models.Session.objects.filter(user_id=user_id).aggregate(
-                first_login=Min("start_time")
-            )
-        )["first_login"]
-
-        response.data["distinct_device_count"] = distinct_devices_count
-        response.data["first_login"] = first_login
+        response.data["distinct_device_count"] = self.activity_summary.distinct_device_count
+        response.data["first_login"] = self.activity_summary.first_login
         return response
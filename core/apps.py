@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.mail import register_template
+
+        # precompile transactional email templates once at startup
+        register_template("otp", "otp.html", "otp.txt", variables=("otp",))
@@ -1,4 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class CustomPagination(PageNumberPagination):
     """
@@ -20,4 +31,211 @@ class CustomPagination(PageNumberPagination):
     )
     page_size_query_param = (
         "size"  # Allows clients to override the default page size via query.
-    )
\ No newline at end of file
+    )
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination for time-ordered lists. Pages continue from the
+    ordering values of the last row seen, carried in an opaque cursor,
+    instead of an OFFSET, so every page costs the same index range scan and
+    no COUNT query is run.
+
+    The ordering must be unique and its fields non-null, e.g. a timestamp
+    followed by the primary key as tie-breaker. Views can override it with
+    a `keyset_ordering` attribute.
+
+    Attributes:
+        page_size (int): The default number of items to display per page.
+        page_size_query_param (str): The query parameter name to allow clients
+                                     to set a custom page size.
+        max_page_size (int): Upper limit of the page size clients can request.
+        cursor_query_param (str): The query parameter name for the cursor.
+        ordering (tuple): Fields to order and paginate by.
+        estimated_count (bool): Whether to add an estimated count of all rows
+                                to the response, see `get_estimated_count`.
+        count_field (str): The response field holding the estimated count.
+    """
+
+    page_size = 10
+    page_size_query_param = "size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering = ("-start_time", "-id")
+    estimated_count = False
+    count_field = "estimated_count"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = getattr(view, "keyset_ordering", self.ordering)
+        self.fields = [field.lstrip("-") for field in self.ordering]
+        position, self.reverse = self.decode_cursor(queryset.model, request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        page_queryset = queryset.order_by(*ordering)
+        if position is not None:
+            page_queryset = page_queryset.filter(self.get_after_filter(ordering, position))
+
+        rows = list(page_queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        # going forward there is a previous page whenever a cursor was given,
+        # going back there is always a next page
+        self.has_next = True if self.reverse else has_more
+        self.has_previous = has_more if self.reverse else position is not None
+
+        self.count = None
+        if self.estimated_count:
+            self.count = self.get_estimated_count(queryset, view)
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith("-") else "-" + field
+
+    def get_after_filter(self, ordering, position):
+        """
+        Returns the filter for rows after `position` in `ordering`, e.g. for
+        ("-start_time", "-id"): start_time <= t AND (start_time < t OR
+        (start_time = t AND id < i)).
+        """
+        condition = None
+        for order, field, value in reversed(list(zip(ordering, self.fields, position))):
+            lookup = "lt" if order.startswith("-") else "gt"
+            after = Q(**{"%s__%s" % (field, lookup): value})
+            if condition is not None:
+                after |= Q(**{field: value}) & condition
+            condition = after
+        # redundant range on the leading field, bounds the index scan
+        lookup = "lte" if ordering[0].startswith("-") else "gte"
+        return Q(**{"%s__%s" % (self.fields[0], lookup): position[0]}) & condition
+
+    def encode_cursor(self, row, reverse=False):
+        """
+        Returns the cursor continuing after `row`, or before it if `reverse`.
+        """
+        position = [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in (getattr(row, field) for field in self.fields)
+        ]
+        payload = json.dumps({"p": position, "r": reverse}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def get_cursor_link(self, row, reverse=False):
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(row, reverse),
+        )
+
+    def decode_cursor(self, model, request):
+        """
+        Returns:
+            tuple: Ordering values to continue after (None for the first
+                   page) and whether to page backwards.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position = [
+                model._meta.pk.to_python(value)
+                if field in ("pk", "id")
+                else model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, payload["p"], strict=True)
+            ]
+            return position, bool(payload["r"])
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_estimated_count(self, queryset, view):
+        """
+        Returns the view's own estimate (`get_estimated_count(queryset)`) if it
+        has one, otherwise the query planner's row estimate on PostgreSQL, or
+        None where no cheap estimate exists.
+        """
+        if hasattr(view, "get_estimated_count"):
+            return view.get_estimated_count(queryset)
+
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) %s" % sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]["Plan Rows"]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_cursor_link(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_cursor_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        # same order as PageNumberPagination
+        response = OrderedDict()
+        if self.estimated_count:
+            response[self.count_field] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        properties = {}
+        if self.estimated_count:
+            properties[self.count_field] = {"type": "integer", "nullable": True}
+        properties["next"] = {"type": "string", "nullable": True, "format": "uri"}
+        properties["previous"] = {"type": "string", "nullable": True, "format": "uri"}
+        properties["results"] = schema
+        return {"type": "object", "required": ["results"], "properties": properties}
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class EstimatedCountKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination that adds an "estimated_count" of all rows to every
+    page, see `KeysetPagination.get_estimated_count`.
+    """
+
+    estimated_count = True
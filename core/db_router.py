@@ -0,0 +1,137 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """
+    Database routing state of one request, see `ReadYourWritesMiddleware`.
+
+    Attributes:
+        pinned (bool): Reads go to the primary database.
+        wrote (bool): The request wrote to the primary database.
+        user_id (int): The user the request acts for, None until
+                       `route_for_user` is called.
+    """
+
+    __slots__ = ("pinned", "wrote", "user_id")
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.user_id = None
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+@contextmanager
+def track_writes():
+    """
+    Routes the reads of the enclosed block with a fresh `RoutingState`,
+    which is yielded.
+    """
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """
+    Sends the reads of the enclosed block to the primary database. Reads
+    after the block stay there if it wrote.
+    """
+    state = _state.get()
+    if state is None:
+        with track_writes() as state:
+            state.pinned = True
+            yield
+        return
+
+    pinned, state.pinned = state.pinned, True
+    try:
+        yield
+    finally:
+        state.pinned = pinned or state.wrote
+
+
+def get_recent_write_cache_key(user_id):
+    return "db_recent_write:%s" % user_id
+
+
+def mark_recent_write(user_id):
+    """
+    Keeps the reads of the user on the primary database for
+    DATABASE_REPLICA_STICKY_SECONDS, long enough for replicas to catch up
+    with their write.
+    """
+    caches[settings.DATABASE_REPLICA_CACHE_ALIAS].set(
+        get_recent_write_cache_key(user_id),
+        True,
+        settings.DATABASE_REPLICA_STICKY_SECONDS,
+    )
+
+
+def route_for_user(user_id):
+    """
+    Records the user the current request acts for, pinning its reads to the
+    primary database if the user wrote recently. Called by the
+    authentication class and by the views issuing tokens.
+    """
+    state = _state.get()
+    if state is None or not settings.DATABASE_REPLICAS:
+        return
+    state.user_id = user_id
+    if not state.pinned and caches[settings.DATABASE_REPLICA_CACHE_ALIAS].get(
+        get_recent_write_cache_key(user_id)
+    ):
+        state.pinned = True
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends writes to the primary (default) database and reads to a random
+    database of DATABASE_REPLICAS.
+
+    Reads stay on the primary while it is in a transaction, for the rest of
+    a request once the request wrote, and for DATABASE_REPLICA_STICKY_SECONDS
+    after a user's own write, see `route_for_user`. Without replicas every
+    query goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is not None and state.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -1,30 +1,319 @@
-from drf_template import settings
+import queue
+import re
+import smtplib
+import threading
+import time
+from contextlib import contextmanager, suppress
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.signals import setting_changed
 from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives
+from django.utils.html import escape
 
-def send_mail_func(to, subject, template, **kwargs):
+
+class PooledConnection:
     """
-    Sends an email with the specified subject, template, and context.
-    
+    A mail backend connection kept open between sends, with the bookkeeping
+    the pool needs to decide when to recycle it.
+    """
+
+    def __init__(self):
+        self.backend = get_connection(fail_silently=False)
+        self.messages_sent = 0
+        self.last_used = None
+
+    def open(self):
+        self.backend.open()
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.backend.close()
+        finally:
+            self.last_used = None
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+
+class MailConnectionPool:
+    """
+    Pool of long-lived mail connections, so sending an email does not pay for
+    a new TLS handshake with the SMTP server every time.
+
+    Attributes:
+        size (int): Maximum number of open connections.
+        max_messages (int): Messages sent over one connection before it is
+                            reopened, SMTP servers limit this per session.
+        idle_timeout (float): Seconds a connection may sit unused before it is
+                              reopened instead of risking a dropped session.
+        acquire_timeout (float): Seconds to wait for a connection when all
+                                 are in use, before raising TimeoutError.
+    """
+
+    def __init__(self, size=2, max_messages=100, idle_timeout=60, acquire_timeout=30):
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            if create:
+                connection = PooledConnection()
+            else:
+                try:
+                    connection = self.idle.get(timeout=self.acquire_timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        "No mail connection available after %ss" % self.acquire_timeout
+                    )
+
+        try:
+            if connection.last_used is None:
+                connection.open()
+            elif (
+                connection.messages_sent >= self.max_messages
+                or time.monotonic() - connection.last_used > self.idle_timeout
+            ):
+                connection.reconnect()
+        except Exception:
+            # back to the pool closed, the next acquire opens it again
+            with suppress(Exception):
+                connection.close()
+            self.idle.put(connection)
+            raise
+        return connection
+
+    def release(self, connection):
+        # connections closed by a failed reconnect stay closed
+        if connection.last_used is not None:
+            connection.last_used = time.monotonic()
+        self.idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def send_messages(self, messages):
+        """
+        Sends messages one by one over one pooled connection. If the server
+        dropped the connection it is reopened once and sending resumes with
+        the message that failed, messages already delivered are not sent
+        again. Other errors (refused recipients, rejected data) are raised
+        without resending anything.
+
+        Returns:
+            int: Number of messages sent.
+        """
+        sent = 0
+        reconnected = False
+        with self.connection() as connection:
+            for message in messages:
+                try:
+                    count = connection.backend.send_messages([message]) or 0
+                except smtplib.SMTPServerDisconnected:
+                    if reconnected:
+                        raise
+                    reconnected = True
+                    connection.reconnect()
+                    count = connection.backend.send_messages([message]) or 0
+                sent += count
+                connection.messages_sent += count
+        return sent
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.created -= 1
+
+
+@lru_cache(maxsize=None)
+def get_mail_pool():
+    """
+    Returns the process-wide mail connection pool configured by the
+    EMAIL_POOL_* settings.
+    """
+    return MailConnectionPool(
+        size=settings.EMAIL_POOL_SIZE,
+        max_messages=settings.EMAIL_POOL_MAX_MESSAGES,
+        idle_timeout=settings.EMAIL_POOL_IDLE_TIMEOUT,
+        acquire_timeout=settings.EMAIL_POOL_ACQUIRE_TIMEOUT,
+    )
+
+
+def reset_mail_pool(setting, **kwargs):
+    if setting == "EMAIL_BACKEND" or setting.startswith("EMAIL_POOL_"):
+        if get_mail_pool.cache_info().currsize:
+            get_mail_pool().close()
+        get_mail_pool.cache_clear()
+
+
+setting_changed.connect(reset_mail_pool)
+
+
+class TransactionalTemplate:
+    """
+    Email template rendered once with placeholders in place of its variables,
+    so sending an email only substitutes the per-message values into the
+    pre-rendered HTML and plain-text bodies, without touching the template
+    engine or the filesystem.
+
+    Only suitable for templates that print their variables as they are,
+    variables used in tags or filters would render the placeholder instead.
+
+    Attributes:
+        html_parts (list): Rendered HTML split around the variables, literal
+                           text at even and variable names at odd positions.
+        text_parts (list): Same for the plain-text alternative, or None.
+    """
+
+    def __init__(self, html_template, text_template=None, variables=()):
+        placeholders = {name: "\x00%s\x00" % name for name in variables}
+        self.pattern = None
+        if placeholders:
+            self.pattern = re.compile(
+                "\x00(%s)\x00" % "|".join(map(re.escape, placeholders))
+            )
+        self.html_parts = self.split(render_to_string(html_template, placeholders))
+        self.text_parts = None
+        if text_template:
+            self.text_parts = self.split(render_to_string(text_template, placeholders))
+
+    def split(self, rendered):
+        if self.pattern is None:
+            return [rendered]
+        return self.pattern.split(rendered)
+
+    def substitute(self, parts, context, autoescape):
+        rendered = list(parts)
+        for i in range(1, len(parts), 2):
+            value = str(context.get(parts[i], ""))
+            rendered[i] = escape(value) if autoescape else value
+        return "".join(rendered)
+
+    def render(self, context):
+        """
+        Returns:
+            tuple: HTML body and plain-text body (None without a text template).
+        """
+        html = self.substitute(self.html_parts, context, autoescape=True)
+        text = None
+        if self.text_parts is not None:
+            text = self.substitute(self.text_parts, context, autoescape=False)
+        return html, text
+
+
+# Precompiled templates by name, see register_template
+TRANSACTIONAL_TEMPLATES = {}
+
+
+def register_template(name, html_template, text_template=None, variables=()):
+    """
+    Precompiles a transactional email template so send_mail_func can be
+    called with `name` as its template.
+
+    Args:
+        name (str): Name to send the template by.
+        html_template (str): Path to the HTML template.
+        text_template (str, optional): Path to the plain-text template.
+        variables (iterable): Context variables substituted per email.
+    """
+    TRANSACTIONAL_TEMPLATES[name] = TransactionalTemplate(
+        html_template, text_template, variables
+    )
+
+
+def build_mail_message(to, subject, template, **kwargs):
+    """
+    Builds an email with the specified subject, template, and context.
+
     Args:
         to (list): List of recipient email addresses.
         subject (str): Subject of the email.
-        template (str): Path to the HTML template to use.
+        template (str): Name of a registered template, or path to the HTML
+                        template to use.
         **kwargs: Context variables to populate the template.
+
+    Returns:
+        EmailMultiAlternatives: The email, not sent yet.
     """
     # Render the HTML content with the provided context
-    html_content = render_to_string(template, kwargs)
+    if template in TRANSACTIONAL_TEMPLATES:
+        html_content, text_content = TRANSACTIONAL_TEMPLATES[template].render(kwargs)
+    else:
+        html_content, text_content = render_to_string(template, kwargs), None
 
     # Create the email message with both plain text and HTML parts
     email = EmailMultiAlternatives(
         subject=subject,
+        body=text_content or "",
         from_email=settings.EMAIL_HOST_USER,
         to=to,
     )
-    
+
     # Attach the HTML content as an alternative
     email.attach_alternative(html_content, "text/html")
-    
-    # Send the email
-    email.send(fail_silently=False)
+    return email
+
+
+def send_mail_func(to, subject, template, **kwargs):
+    """
+    Sends an email with the specified subject, template, and context.
+
+    Args:
+        to (list): List of recipient email addresses.
+        subject (str): Subject of the email.
+        template (str): Name of a registered template, or path to the HTML
+                        template to use.
+        **kwargs: Context variables to populate the template.
+    """
+    email = build_mail_message(to, subject, template, **kwargs)
+
+    # Send the email over a pooled connection
+    get_mail_pool().send_messages([email])
+
+
+def send_mass_mail_func(messages):
+    """
+    Sends many emails, reusing pooled connections for as many messages as
+    the pool allows per connection.
+
+    Args:
+        messages (iterable): Tuples of (to, subject, template, context) with
+                             the same meaning as the send_mail_func arguments.
+
+    Returns:
+        int: Number of emails sent.
+    """
+    pool = get_mail_pool()
+    emails = [
+        build_mail_message(to, subject, template, **context)
+        for to, subject, template, context in messages
+    ]
 
+    sent = 0
+    for start in range(0, len(emails), pool.max_messages):
+        sent += pool.send_messages(emails[start : start + pool.max_messages])
+    return sent
@@ -0,0 +1,111 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from authentication import services
+from authentication.models import Session, User
+from authentication.views import RecentActivityListAPIView
+from core.custom_pagination import EstimatedCountKeysetPagination, KeysetPagination
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of the first and a deep page of the recent "
+        "activity endpoint with OFFSET/COUNT pagination and keyset "
+        "pagination. The benchmark data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=100_000)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument(
+            "--pages",
+            type=int,
+            nargs="+",
+            default=[1, 10_000],
+            help="Page numbers to measure",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.user = self.populate(options["sessions"], options["batch_size"])
+            self.factory = APIRequestFactory()
+            self.page_size = options["page_size"]
+            self.repeat = options["repeat"]
+
+            for page in options["pages"]:
+                self.stdout.write(self.style.MIGRATE_HEADING("Page %d" % page))
+                self.report("offset + count", PageNumberPagination, {"page": page})
+                cursor = self.get_cursor(page)
+                if cursor is None and page > 1:
+                    self.stdout.write("  page %d is past the last session" % page)
+                    continue
+                params = {"cursor": cursor} if cursor else {}
+                self.report("keyset", KeysetPagination, params)
+                self.report("keyset + estimate", EstimatedCountKeysetPagination, params)
+
+            transaction.set_rollback(True)
+
+    def populate(self, sessions, batch_size):
+        self.stdout.write("Inserting %d sessions..." % sessions)
+        user = User.objects.create_user(email="pagination-benchmark@example.com")
+        for start in range(0, sessions, batch_size):
+            Session.objects.bulk_create(
+                Session(user=user, device_id="device-%d" % (i % 5))
+                for i in range(start, min(start + batch_size, sessions))
+            )
+        services.rebuild_activity_summary(user.id)
+        return user
+
+    def get_cursor(self, page):
+        """
+        Returns the keyset cursor of `page`, the position of the last session
+        of the page before it.
+        """
+        if page <= 1:
+            return None
+        paginator = KeysetPagination()
+        paginator.fields = [field.lstrip("-") for field in paginator.ordering]
+        last_row = (
+            Session.objects.filter(user=self.user)
+            .order_by(*paginator.ordering)[(page - 1) * self.page_size - 1 :]
+            .first()
+        )
+        if last_row is None:
+            return None
+        return paginator.encode_cursor(last_row)
+
+    def report(self, title, pagination_class, params):
+        pagination_class = type(
+            pagination_class.__name__, (pagination_class,), {"page_size": self.page_size}
+        )
+        initkwargs = {"pagination_class": pagination_class}
+        if issubclass(pagination_class, PageNumberPagination):
+            # the view paginates ?page=N requests with this one
+            initkwargs["page_number_pagination_class"] = pagination_class
+        view = RecentActivityListAPIView.as_view(**initkwargs)
+
+        timings = []
+        for _ in range(self.repeat):
+            request = self.factory.get("/api/auth/profile/recent-activity", params)
+            force_authenticate(request, self.user)
+            started = time.perf_counter()
+            response = view(request)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.data
+
+        timings.sort()
+        self.stdout.write(
+            "  %-18s median %7.2f ms, max %7.2f ms, %d results"
+            % (
+                title,
+                timings[len(timings) // 2] * 1000,
+                timings[-1] * 1000,
+                len(response.data["results"]),
+            )
+        )
@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter per profile, so startup is measured from scratch
+PROFILE_SCRIPT = """
+import json, sys, time
+
+started = time.perf_counter()
+import django
+from django.core.wsgi import get_wsgi_application
+
+application = get_wsgi_application()
+from django.urls import get_resolver
+
+get_resolver().url_patterns
+startup = time.perf_counter() - started
+
+from django.conf import settings
+from django.test import Client
+
+client = Client()
+path, requests = sys.argv[1], int(sys.argv[2])
+for _ in range(20):
+    client.get(path)
+started = time.perf_counter()
+for _ in range(requests):
+    status = client.get(path).status_code
+elapsed = time.perf_counter() - started
+
+print(json.dumps({
+    "startup": startup,
+    "request": elapsed / requests,
+    "status": status,
+    "apps": len(settings.INSTALLED_APPS),
+    "middleware": len(settings.MIDDLEWARE),
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare process startup time and per-request overhead of the "
+        "development and production SETTINGS_PROFILE, each measured in a "
+        "fresh Python process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--runs", type=int, default=3, help="Processes per profile")
+        parser.add_argument(
+            "--path",
+            default="/api/auth/profile/me",
+            help="Path to request, the default answers 401 without touching the database",
+        )
+
+    def handle(self, *args, **options):
+        for profile in ("development", "production"):
+            env = dict(
+                os.environ,
+                SETTINGS_PROFILE=profile,
+                DJANGO_SETTINGS_MODULE=os.environ.get(
+                    "DJANGO_SETTINGS_MODULE", "drf_template.settings"
+                ),
+            )
+            results = []
+            for _ in range(options["runs"]):
+                process = subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        PROFILE_SCRIPT,
+                        options["path"],
+                        str(options["requests"]),
+                    ],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                )
+                if process.returncode:
+                    raise CommandError(
+                        "%s profile failed:\n%s" % (profile, process.stderr)
+                    )
+                results.append(json.loads(process.stdout.splitlines()[-1]))
+
+            best = min(results, key=lambda result: result["startup"] + result["request"])
+            self.stdout.write(
+                "%-12s %2d apps, %2d middleware: startup %6.1f ms, "
+                "%.3f ms per request (HTTP %d)"
+                % (
+                    profile,
+                    best["apps"],
+                    best["middleware"],
+                    min(result["startup"] for result in results) * 1000,
+                    min(result["request"] for result in results) * 1000,
+                    best["status"],
+                )
+            )
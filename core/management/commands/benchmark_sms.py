@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.sms import get_twilio_client, send_bulk_sms_func
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure SMS throughput of send_bulk_sms_func offline, against "
+        "core.sms.FakeTwilioHttpClient with a simulated provider latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 10, 50],
+            help="Concurrency limits to compare",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Simulated provider round trip in seconds",
+        )
+
+    def handle(self, *args, **options):
+        messages = [
+            ("+1555%07d" % i, "Benchmark message %d" % i)
+            for i in range(options["messages"])
+        ]
+
+        with override_settings(
+            TWILIO_HTTP_CLIENT="core.sms.FakeTwilioHttpClient",
+            TWILIO_HTTP_CLIENT_OPTIONS={"latency": options["latency"]},
+        ):
+            for concurrency in options["concurrency"]:
+                started = time.perf_counter()
+                results = send_bulk_sms_func(messages, max_concurrency=concurrency)
+                elapsed = time.perf_counter() - started
+
+                failed = sum(isinstance(result, Exception) for result in results)
+                self.stdout.write(
+                    "concurrency %4d: %d messages in %.2fs (%.0f messages/s), "
+                    "%d failed, %d requests sent"
+                    % (
+                        concurrency,
+                        len(results),
+                        elapsed,
+                        len(results) / elapsed,
+                        failed,
+                        get_twilio_client().http_client.requests_sent,
+                    )
+                )
+                get_twilio_client.cache_clear()
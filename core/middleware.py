@@ -0,0 +1,174 @@
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import db_router
+
+logger = logging.getLogger("core.queries")
+
+# Parts of a query that vary between executions of the same statement
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+
+
+def fingerprint(sql):
+    """
+    Returns `sql` with its literals and IN lists collapsed, so executions of
+    the same statement share one fingerprint.
+    """
+    sql = LITERALS.sub("?", sql)
+    return PLACEHOLDER_LISTS.sub("(...)", sql)
+
+
+class QueryStats:
+    """
+    Database execute wrapper collecting the queries of one request.
+
+    Attributes:
+        count (int): Number of queries run.
+        duration (float): Seconds spent in the database.
+        fingerprints (Counter): Executions per query fingerprint.
+        captured (list): (alias, sql, params, duration) of every query when
+                         capturing, None otherwise.
+    """
+
+    def __init__(self, capture=False):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.captured = [] if capture else None
+
+    def wrapper(self, alias):
+        def execute(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duration = time.perf_counter() - started
+                self.count += 1
+                self.duration += duration
+                self.fingerprints[fingerprint(sql)] += 1
+                if self.captured is not None:
+                    self.captured.append((alias, sql, params, duration))
+
+        return execute
+
+    def repeated(self, threshold):
+        """
+        Returns the fingerprints run at least `threshold` times, the mark of
+        an N+1 query pattern.
+        """
+        return {sql: n for sql, n in self.fingerprints.items() if n >= threshold}
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the query count, database time, repeated query fingerprints and
+    view time of every request.
+
+    The timings are returned in a Server-Timing header and logged on the
+    "core.queries" logger with the numbers in `extra`, for structured log
+    handlers. One in QUERY_INSTRUMENTATION_SAMPLE_RATE requests also logs
+    every query it ran. A statement repeated at least
+    QUERY_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD times in one request is logged
+    as a likely N+1 query.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.QUERY_INSTRUMENTATION_SAMPLE_RATE
+        self.n_plus_one_threshold = settings.QUERY_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD
+
+    def __call__(self, request):
+        sampled = self.sample_rate > 0 and random.randrange(self.sample_rate) == 0
+        stats = QueryStats(capture=sampled)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(stats.wrapper(connection.alias))
+                )
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        response.headers["Server-Timing"] = (
+            'db;dur=%.1f;desc="%d queries", app;dur=%.1f'
+            % (stats.duration * 1000, stats.count, (duration - stats.duration) * 1000)
+        )
+        self.log(request, response, stats, duration)
+        return response
+
+    def log(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else request.path
+        repeated = stats.repeated(self.n_plus_one_threshold)
+        extra = {
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "query_count": stats.count,
+            "db_time_ms": round(stats.duration * 1000, 3),
+            "view_time_ms": round(duration * 1000, 3),
+            "duplicate_queries": sum(n - 1 for n in stats.fingerprints.values()),
+        }
+        logger.info(
+            "%(method)s %(view)s %(status)s: %(query_count)d queries, "
+            "%(db_time_ms).1f ms db, %(view_time_ms).1f ms total" % extra,
+            extra=extra,
+        )
+
+        for sql, n in repeated.items():
+            logger.warning(
+                "Possible N+1 in %s: query run %d times: %s",
+                view,
+                n,
+                sql,
+                extra={"view": view, "repetitions": n, "fingerprint": sql},
+            )
+
+        if stats.captured is not None:
+            for alias, sql, params, query_duration in stats.captured:
+                logger.info(
+                    "[%s] %.2f ms %s %r",
+                    alias,
+                    query_duration * 1000,
+                    sql,
+                    params,
+                    extra={"view": view, "sampled": True},
+                )
+
+
+class ReadYourWritesMiddleware:
+    """
+    Tracks the database writes of every request for
+    `core.db_router.PrimaryReplicaRouter`.
+
+    Once a request writes, its remaining reads go to the primary database,
+    and so do the reads of the user it acted for during the next
+    DATABASE_REPLICA_STICKY_SECONDS, so they never miss their own write on a
+    lagging replica. The user is the one passed to `route_for_user`, which
+    the JWT authentication class and the login and refresh views call.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with db_router.track_writes() as state:
+            response = self.get_response(request)
+        if state.wrote and state.user_id is not None:
+            db_router.mark_recent_write(state.user_id)
+        return response
@@ -1,8 +1,102 @@
-from twilio.rest import Client
+import itertools
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from twilio.http import HttpClient
+from twilio.http.http_client import TwilioHttpClient
+from twilio.http.response import Response
+from twilio.rest import Client
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """
+    Twilio HTTP client on one keep-alive requests session, with a connection
+    pool large enough for `pool_maxsize` concurrent requests.
+    """
+
+    def __init__(self, pool_maxsize=10, timeout=None, max_retries=None, **options):
+        super().__init__(pool_connections=True, timeout=timeout)
+        self.session.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=pool_maxsize,
+                max_retries=max_retries or 0,
+            ),
+        )
+
+
+class FakeTwilioHttpClient(HttpClient):
+    """
+    Local stand-in transport, answers every request like the Messages API
+    without network access, after `latency` seconds.
+
+    Used to benchmark SMS throughput offline and in tests.
+    """
+
+    def __init__(self, latency=0.0, **options):
+        super().__init__(logger=logging.getLogger("twilio.http_client"), is_async=False)
+        self.latency = latency
+        self.counter = itertools.count(1)
+        self.requests_sent = 0
+
+    def request(
+        self,
+        method,
+        uri,
+        params=None,
+        data=None,
+        headers=None,
+        auth=None,
+        timeout=None,
+        allow_redirects=False,
+    ):
+        if self.latency:
+            time.sleep(self.latency)
+        self.requests_sent = next(self.counter)
+        data = data or {}
+        body = {
+            "sid": "SM%s" % uuid.uuid4().hex,
+            "status": "queued",
+            "to": data.get("To"),
+            "from": data.get("From"),
+            "body": data.get("Body"),
+        }
+        return Response(201, json.dumps(body))
+
+
+@lru_cache(maxsize=None)
+def get_twilio_client():
+    """
+    Returns the process-wide Twilio client, its HTTP client is configured by
+    TWILIO_HTTP_CLIENT and TWILIO_HTTP_CLIENT_OPTIONS.
+    """
+    http_client_class = import_string(settings.TWILIO_HTTP_CLIENT)
+    return Client(
+        settings.TWILIO_ACCOUNT_SID,
+        settings.TWILIO_AUTH_TOKEN,
+        http_client=http_client_class(**settings.TWILIO_HTTP_CLIENT_OPTIONS),
+    )
+
+
+def reset_twilio_client(setting, **kwargs):
+    if setting.startswith("TWILIO_"):
+        get_twilio_client.cache_clear()
+
+
+setting_changed.connect(reset_twilio_client)
+
 
 def send_sms_func(phone_number, body):
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    client = get_twilio_client()
 
     message = client.messages.create(
         body=body,
@@ -11,3 +105,33 @@ def send_sms_func(phone_number, body):
     )
 
     return message.sid
+
+
+def send_bulk_sms_func(messages, max_concurrency=None):
+    """
+    Sends many SMS concurrently over the shared client.
+
+    Args:
+        messages (iterable): Tuples of (phone_number, body).
+        max_concurrency (int, optional): Messages in flight at once. Defaults
+                                         to TWILIO_MAX_CONCURRENCY.
+
+    Returns:
+        list: Per message, in order, its sid or the exception raised sending it.
+    """
+    max_concurrency = max_concurrency or settings.TWILIO_MAX_CONCURRENCY
+    with ThreadPoolExecutor(
+        max_workers=max_concurrency, thread_name_prefix="sms-sender"
+    ) as executor:
+        futures = [
+            executor.submit(send_sms_func, phone_number, body)
+            for phone_number, body in messages
+        ]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
@@ -0,0 +1,142 @@
+"""
+Background tasks, run by the backend configured with TASK_BACKEND.
+
+ThreadPoolTaskBackend keeps queued tasks and pending retries in memory
+only: they are lost when the process exits or crashes, e.g. OTP mails of
+a worker restarted before sending them. Tasks that must not be lost need a
+backend with a persistent queue.
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseTaskBackend:
+    """
+    Base class for background task backends.
+
+    A task is a plain callable with its arguments, backends decide where and
+    when it runs. Options a backend does not use are ignored.
+    """
+
+    def __init__(self, **options):
+        pass
+
+    def enqueue(self, func, *args, **kwargs):
+        raise NotImplementedError
+
+
+class ImmediateTaskBackend(BaseTaskBackend):
+    """
+    Runs tasks right away in the calling thread.
+    """
+
+    def enqueue(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+
+class LocmemTaskBackend(BaseTaskBackend):
+    """
+    Local stand-in backend for tests.
+
+    Tasks are kept in `outbox` instead of being run, `run_pending` runs and
+    clears them.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.outbox = []
+
+    def enqueue(self, func, *args, **kwargs):
+        self.outbox.append((func, args, kwargs))
+
+    def run_pending(self):
+        tasks, self.outbox = self.outbox, []
+        for func, args, kwargs in tasks:
+            func(*args, **kwargs)
+
+
+class ThreadPoolTaskBackend(BaseTaskBackend):
+    """
+    Runs tasks on a pool of background worker threads.
+
+    A failing task is retried up to `max_retries` times, waiting
+    `retry_backoff * 2 ** attempt` seconds before each retry. Tasks run in a
+    copy of the context they were enqueued from, so a task enqueued after a
+    write keeps reading from the primary database, see core.db_router.
+    """
+
+    def __init__(self, max_workers=4, max_retries=3, retry_backoff=1.0, **options):
+        super().__init__(**options)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="task-worker"
+        )
+
+    def enqueue(self, func, *args, **kwargs):
+        self.submit(func, args, kwargs, 0)
+
+    def submit(self, func, args, kwargs, attempt):
+        context = contextvars.copy_context()
+        self.executor.submit(context.run, self.run, func, args, kwargs, attempt)
+
+    def run(self, func, args, kwargs, attempt):
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            if attempt >= self.max_retries:
+                logger.exception(
+                    "Task %s failed after %d attempts", func.__qualname__, attempt + 1
+                )
+                return
+            delay = self.retry_backoff * 2**attempt
+            logger.warning(
+                "Task %s failed, retrying in %.1fs", func.__qualname__, delay,
+                exc_info=True,
+            )
+            timer = threading.Timer(
+                delay,
+                contextvars.copy_context().run,
+                (self.submit, func, args, kwargs, attempt + 1),
+            )
+            timer.daemon = True
+            timer.start()
+        finally:
+            # database connections are per thread, don't leak them from workers
+            connections.close_all()
+
+
+@lru_cache(maxsize=None)
+def get_task_backend():
+    """
+    Return the process-wide task backend configured by TASK_BACKEND and
+    TASK_BACKEND_OPTIONS
+    """
+    backend_class = import_string(settings.TASK_BACKEND)
+    return backend_class(**getattr(settings, "TASK_BACKEND_OPTIONS", {}))
+
+
+def enqueue_on_commit(func, *args, **kwargs):
+    """
+    Enqueue func on the task backend once the current transaction commits,
+    right away when called outside of a transaction
+    """
+    transaction.on_commit(lambda: get_task_backend().enqueue(func, *args, **kwargs))
+
+
+def reset_task_backend(setting, **kwargs):
+    if setting in ("TASK_BACKEND", "TASK_BACKEND_OPTIONS"):
+        get_task_backend.cache_clear()
+
+
+setting_changed.connect(reset_task_backend)
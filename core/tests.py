@@ -1,3 +1,649 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import smtplib
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.mail.backends.base import BaseEmailBackend
+from django.template.loader import render_to_string
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.response import Response as TwilioResponse
+
+from authentication.models import Session, User
+from core import db_router
+from core.mail import TRANSACTIONAL_TEMPLATES, MailConnectionPool, TransactionalTemplate
+from core.sms import (
+    FakeTwilioHttpClient,
+    PooledTwilioHttpClient,
+    get_twilio_client,
+    send_bulk_sms_func,
+)
+from core.tasks import ThreadPoolTaskBackend, enqueue_on_commit, get_task_backend
+from core.uploads import (
+    SizeLimitedUploadHandler,
+    generate_thumbnails,
+    get_thumbnail_name,
+    save_content_addressed,
+)
+from core.validations import FileTooLarge
+from core.views import parse_range, serve_media
+from core.middleware import QueryInstrumentationMiddleware, ReadYourWritesMiddleware
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        for header, size, expected in [
+            ("bytes=0-9", 100, (0, 9)),
+            ("bytes=90-", 100, (90, 99)),
+            ("bytes=90-200", 100, (90, 99)),
+            ("bytes=-5", 100, (95, 99)),
+            ("bytes=-500", 100, (0, 99)),
+            # unsatisfiable
+            ("bytes=100-", 100, ()),
+            ("bytes=-0", 100, ()),
+            ("bytes=-5", 0, ()),
+            ("bytes=0-", 0, ()),
+            # ignored
+            ("bytes=9-0", 100, None),
+            ("bytes=0-1,5-6", 100, None),
+            ("items=0-1", 100, None),
+            ("bytes=-", 100, None),
+        ]:
+            self.assertEqual(parse_range(header, size), expected, header)
+
+
+class ServeMediaTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        for name, content in (("file.txt", b"0123456789"), ("empty.txt", b"")):
+            with open(os.path.join(media_root.name, name), "wb") as f:
+                f.write(content)
+
+    def get(self, path, **headers):
+        return serve_media(RequestFactory().get("/", headers=headers), path)
+
+    def test_not_modified(self):
+        etag = self.get("file.txt")["ETag"]
+        response = self.get("file.txt", if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_range(self):
+        response = self.get("file.txt", range="bytes=2-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-4/10")
+        self.assertEqual(b"".join(response.streaming_content), b"234")
+
+    def test_range_not_satisfiable(self):
+        for path, header, size in (
+            ("file.txt", "bytes=10-", 10),
+            ("empty.txt", "bytes=-5", 0),
+        ):
+            response = self.get(path, range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response["Content-Range"], "bytes */%d" % size)
+
+    def test_range_ignored_for_other_if_range(self):
+        response = self.get("file.txt", range="bytes=2-4", if_range='"other"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+def make_png(size=(300, 200)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class SizeLimitedUploadHandlerTests(SimpleTestCase):
+    def upload(self, content, max_size, chunk_size=64):
+        handler = SizeLimitedUploadHandler(max_size=max_size)
+        handler.new_file("file", "upload.png", "image/png", len(content))
+        for start in range(0, len(content), chunk_size):
+            handler.receive_data_chunk(content[start : start + chunk_size], start)
+        uploaded_file = handler.file_complete(len(content))
+        self.addCleanup(uploaded_file.close)
+        return uploaded_file
+
+    def test_sniffs_and_hashes_while_reading(self):
+        content = make_png()
+        uploaded_file = self.upload(content, max_size=len(content))
+        self.assertEqual(uploaded_file.image_type, "png")
+        self.assertEqual(uploaded_file.sha256, hashlib.sha256(content).hexdigest())
+        # sniffed from the first chunks, however small
+        self.assertEqual(self.upload(content, max_size=None, chunk_size=5).image_type, "png")
+        self.assertIsNone(self.upload(b"<svg></svg>", max_size=None).image_type)
+
+    def test_rejects_oversized_file_while_reading(self):
+        with self.assertRaises(FileTooLarge):
+            self.upload(b"x" * 1000, max_size=999)
+
+    def test_rejects_oversized_body_before_reading(self):
+        handler = SizeLimitedUploadHandler(max_size=1000)
+        with self.assertRaises(FileTooLarge):
+            handler.handle_raw_input(None, {}, 1000 + 65 * 1024, b"boundary")
+
+
+class UploadStorageTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def test_same_content_is_stored_once(self):
+        content = make_png()
+        name = save_content_addressed("pictures", ContentFile(content), "png")
+        self.assertEqual(name, "pictures/%s.png" % hashlib.sha256(content).hexdigest())
+        self.assertEqual(save_content_addressed("pictures", ContentFile(content), "png"), name)
+        self.assertEqual(default_storage.listdir("pictures")[1], [os.path.basename(name)])
+
+    def test_thumbnails(self):
+        name = save_content_addressed("pictures", ContentFile(make_png()), "png")
+        generate_thumbnails(name, [(64, 64), (256, 256)])
+        for size, expected in (((64, 64), (64, 43)), ((256, 256), (256, 171))):
+            with default_storage.open(get_thumbnail_name(name, size)) as f:
+                image = Image.open(f)
+                self.assertEqual((image.format, image.size), ("PNG", expected))
+
+        # with every thumbnail there the image is not even opened
+        default_storage.delete(name)
+        generate_thumbnails(name, [(64, 64)])
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    """
+    Mail backend whose connections fail to open while `failing` is set.
+    Sending a message whose subject is in `errors` raises that error once,
+    delivered messages are kept in `outbox`.
+    """
+
+    failing = False
+    errors = {}
+    outbox = []
+
+    def open(self):
+        if self.failing:
+            raise OSError("Connection refused")
+        return True
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            error = self.errors.pop(message.subject, None)
+            if error is not None:
+                raise error
+            self.outbox.append(message.subject)
+        return len(email_messages)
+
+
+@override_settings(EMAIL_BACKEND="core.tests.FlakyEmailBackend")
+class MailConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = MailConnectionPool(size=2, acquire_timeout=0.1)
+        self.message = EmailMessage("Subject", "Body", to=["to@example.com"])
+
+    def tearDown(self):
+        FlakyEmailBackend.failing = False
+        FlakyEmailBackend.errors = {}
+        FlakyEmailBackend.outbox = []
+
+    def messages(self, count):
+        return [EmailMessage(str(i), "Body", to=["to@example.com"]) for i in range(count)]
+
+    def test_failed_opens_do_not_exhaust_the_pool(self):
+        FlakyEmailBackend.failing = True
+        for _ in range(self.pool.size + 1):
+            with self.assertRaises(OSError):
+                self.pool.send_messages([self.message])
+
+        FlakyEmailBackend.failing = False
+        self.assertEqual(self.pool.send_messages([self.message]), 1)
+        # every connection created is back in the pool
+        self.assertEqual(self.pool.idle.qsize(), self.pool.created)
+
+    def test_error_partway_does_not_resend_delivered_messages(self):
+        FlakyEmailBackend.errors = {
+            "2": smtplib.SMTPRecipientsRefused({"to@example.com": (550, b"No")})
+        }
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            self.pool.send_messages(self.messages(4))
+        self.assertEqual(FlakyEmailBackend.outbox, ["0", "1"])
+
+    def test_disconnect_partway_resumes_with_failed_message(self):
+        FlakyEmailBackend.errors = {"2": smtplib.SMTPServerDisconnected()}
+        self.assertEqual(self.pool.send_messages(self.messages(4)), 4)
+        self.assertEqual(FlakyEmailBackend.outbox, ["0", "1", "2", "3"])
+
+    def test_acquire_times_out_when_all_connections_are_in_use(self):
+        connections = [self.pool.acquire() for _ in range(self.pool.size)]
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire()
+        self.pool.release(connections[0])
+        self.assertIs(self.pool.acquire(), connections[0])
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_router.PrimaryReplicaRouter()
+        caches[settings.DATABASE_REPLICA_CACHE_ALIAS].clear()
+
+    def request(self, user_id, write=False):
+        """
+        Runs a request through ReadYourWritesMiddleware, returning the
+        database its first read went to.
+        """
+        read_from = []
+
+        def view(request):
+            db_router.route_for_user(user_id)
+            read_from.append(self.router.db_for_read(Session))
+            if write:
+                self.router.db_for_write(Session)
+            return HttpResponse()
+
+        ReadYourWritesMiddleware(view)(RequestFactory().get("/"))
+        return read_from[0]
+
+    def test_reads_go_to_replicas_and_writes_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Session), "replica")
+        self.assertEqual(self.router.db_for_write(Session), "default")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(Session), "default")
+
+    def test_reads_after_write_in_request_go_to_primary(self):
+        with db_router.track_writes():
+            self.assertEqual(self.router.db_for_read(Session), "replica")
+            self.router.db_for_write(Session)
+            self.assertEqual(self.router.db_for_read(Session), "default")
+
+    def test_use_primary(self):
+        with db_router.use_primary():
+            self.assertEqual(self.router.db_for_read(Session), "default")
+        self.assertEqual(self.router.db_for_read(Session), "replica")
+
+    def test_write_in_use_primary_keeps_request_on_primary(self):
+        with db_router.track_writes():
+            with db_router.use_primary():
+                self.router.db_for_write(Session)
+            self.assertEqual(self.router.db_for_read(Session), "default")
+
+    def test_reads_stick_to_primary_after_users_own_write(self):
+        self.assertEqual(self.request(1), "replica")
+        self.request(1, write=True)
+        self.assertEqual(self.request(1), "default")
+        # other users are not affected
+        self.assertEqual(self.request(2), "replica")
+
+    @override_settings(DATABASE_REPLICA_STICKY_SECONDS=0)
+    def test_stickiness_expires(self):
+        self.request(1, write=True)
+        self.assertEqual(self.request(1), "replica")
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate("replica", "authentication"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "authentication"))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "No REPLICA_DATABASE_URLS configured")
+class ReplicaReadTests(TransactionTestCase):
+    """
+    Runs against the replicas of REPLICA_DATABASE_URLS, e.g. with two SQLite
+    files:
+
+        DATABASE_URL=sqlite:///primary.sqlite3 \\
+        REPLICA_DATABASE_URLS=sqlite:///replica.sqlite3 python manage.py test
+
+    Replicas mirror the default test database.
+    """
+
+    databases = "__all__"
+
+    def test_reads_go_to_replica(self):
+        user = User.objects.create_user(email="replica@example.com", password="x")
+        replica = connections[settings.DATABASE_REPLICAS[0]]
+
+        with db_router.track_writes(), CaptureQueriesContext(replica) as queries:
+            self.assertTrue(User.objects.filter(pk=user.pk).exists())
+        self.assertEqual(len(queries), 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite options only")
+class SQLiteOptionsTests(SimpleTestCase):
+    def setUp(self):
+        # the test database lives in memory, where WAL does not apply
+        database_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(database_dir.cleanup)
+        self.name = os.path.join(database_dir.name, "db.sqlite3")
+        default = connections["default"]
+        connections["sqlite_options"] = default.__class__(
+            {**default.settings_dict, "NAME": self.name}, "sqlite_options"
+        )
+        self.addCleanup(connections.__delitem__, "sqlite_options")
+        self.addCleanup(connections["sqlite_options"].close)
+
+    def test_init_command(self):
+        with connections["sqlite_options"].cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA synchronous")
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_transactions_take_write_lock_when_they_begin(self):
+        other = sqlite3.connect(self.name, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with transaction.atomic(using="sqlite_options"):
+            with self.assertRaisesMessage(sqlite3.OperationalError, "locked"):
+                other.execute("BEGIN IMMEDIATE")
+        other.execute("BEGIN IMMEDIATE")
+
+
+class ThreadPoolTaskBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = ThreadPoolTaskBackend(
+            max_workers=1, max_retries=2, retry_backoff=0.05
+        )
+        self.addCleanup(self.backend.executor.shutdown)
+        self.calls = []
+        self.done = threading.Event()
+
+    def task(self, failures):
+        """fails `failures` times, then succeeds"""
+        self.calls.append(time.monotonic())
+        if len(self.calls) <= failures:
+            if len(self.calls) > self.backend.max_retries:
+                self.done.set()
+            raise ValueError("failure %d" % len(self.calls))
+        self.done.set()
+
+    def test_retries_with_backoff(self):
+        with self.assertLogs("core.tasks", "WARNING") as logs:
+            self.backend.enqueue(self.task, 2)
+            self.assertTrue(self.done.wait(5))
+        self.assertEqual(len(self.calls), 3)
+        for attempt, (before, after) in enumerate(zip(self.calls, self.calls[1:])):
+            self.assertGreaterEqual(after - before, 0.05 * 2**attempt)
+        self.assertEqual([record.levelname for record in logs.records], ["WARNING"] * 2)
+
+    def test_gives_up_after_max_retries(self):
+        with self.assertLogs("core.tasks", "WARNING") as logs:
+            self.backend.enqueue(self.task, 10)
+            self.assertTrue(self.done.wait(5))
+            # the failure of the last attempt is logged after the task returns
+            self.backend.executor.shutdown(wait=True)
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(logs.records[-1].levelname, "ERROR")
+
+
+@override_settings(TASK_BACKEND="core.tasks.LocmemTaskBackend")
+class EnqueueOnCommitTests(TestCase):
+    def setUp(self):
+        self.backend = get_task_backend()
+        self.backend.outbox.clear()
+
+    def test_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                enqueue_on_commit(print, "sent")
+                self.assertEqual(self.backend.outbox, [])
+        self.assertEqual(self.backend.outbox, [(print, ("sent",), {})])
+
+    def test_dropped_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                enqueue_on_commit(print, "sent")
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.backend.outbox, [])
+
+
+@override_settings(
+    QUERY_INSTRUMENTATION=True,
+    QUERY_INSTRUMENTATION_SAMPLE_RATE=0,
+    QUERY_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD=3,
+)
+class QueryInstrumentationMiddlewareTests(TestCase):
+    def request(self, queries):
+        """
+        Runs a request making `queries` queries of the same statement through
+        the middleware, returning the response and its log records.
+        """
+
+        def view(request):
+            for pk in range(queries):
+                User.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        with self.assertLogs("core.queries", "INFO") as logs:
+            response = QueryInstrumentationMiddleware(view)(RequestFactory().get("/path"))
+        return response, logs.records
+
+    def test_server_timing(self):
+        response, records = self.request(2)
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=\d+\.\d;desc="2 queries", app;dur=\d+\.\d$',
+        )
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].query_count, 2)
+        self.assertEqual(records[0].view, "/path")
+
+    def test_n_plus_one(self):
+        _, records = self.request(2)
+        self.assertNotIn("WARNING", [record.levelname for record in records])
+
+        _, records = self.request(3)
+        warnings = [record for record in records if record.levelname == "WARNING"]
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0].repetitions, 3)
+        self.assertIn('FROM "User"', warnings[0].fingerprint)
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_sampled_requests_log_every_query(self):
+        _, records = self.request(2)
+        sampled = [record for record in records if getattr(record, "sampled", False)]
+        self.assertEqual(len(sampled), 2)
+
+    @override_settings(QUERY_INSTRUMENTATION=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryInstrumentationMiddleware(HttpResponse)
+
+
+class SlowFirstTwilioHttpClient(FakeTwilioHttpClient):
+    """
+    Answers with the sid "SM<body>", the sooner the later a message is sent,
+    and with a 400 error for messages to FAILING_NUMBER.
+    """
+
+    FAILING_NUMBER = "+15550000000"
+
+    def request(self, method, uri, params=None, data=None, **kwargs):
+        index = int(data["Body"])
+        time.sleep(0.01 * (10 - index))
+        if data["To"] == self.FAILING_NUMBER:
+            return TwilioResponse(
+                400, json.dumps({"code": 21211, "message": "Invalid To number"})
+            )
+        return TwilioResponse(201, json.dumps({"sid": "SM%d" % index}))
+
+
+@override_settings(
+    TWILIO_ACCOUNT_SID="AC00000000000000000000000000000000",
+    TWILIO_AUTH_TOKEN="token",
+    TWILIO_HTTP_CLIENT="core.tests.SlowFirstTwilioHttpClient",
+    TWILIO_HTTP_CLIENT_OPTIONS={},
+)
+class SMSTests(SimpleTestCase):
+    def test_bulk_results_are_in_input_order(self):
+        numbers = ["+1555000000%d" % i for i in range(1, 10)]
+        numbers[4] = SlowFirstTwilioHttpClient.FAILING_NUMBER
+        results = send_bulk_sms_func(
+            [(number, str(i)) for i, number in enumerate(numbers)], max_concurrency=9
+        )
+        self.assertIsInstance(results[4], TwilioRestException)
+        self.assertEqual(results[4].status, 400)
+        self.assertEqual(
+            results[:4] + results[5:], ["SM%d" % i for i in range(9) if i != 4]
+        )
+
+    def test_client_is_shared_until_settings_change(self):
+        client = get_twilio_client()
+        self.assertIs(get_twilio_client(), client)
+        with override_settings(TWILIO_HTTP_CLIENT="core.sms.FakeTwilioHttpClient"):
+            self.assertIsInstance(get_twilio_client().http_client, FakeTwilioHttpClient)
+        self.assertIsNot(get_twilio_client(), client)
+
+    def test_pooled_http_client(self):
+        http_client = PooledTwilioHttpClient(pool_maxsize=7, timeout=5)
+        adapter = http_client.session.get_adapter("https://api.twilio.com/")
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(http_client.timeout, 5)
+
+
+@override_settings(
+    TEMPLATES=[
+        {
+            "BACKEND": "django.template.backends.django.DjangoTemplates",
+            "OPTIONS": {
+                "loaders": [
+                    (
+                        "django.template.loaders.locmem.Loader",
+                        {
+                            "greeting.html": "<p>Hi {{ name }}, {{ name }}!</p>",
+                            "greeting.txt": "Hi {{ name }} ({{ code }})",
+                            "static.html": "<p>\x00\x00</p>",
+                        },
+                    )
+                ]
+            },
+        }
+    ]
+)
+class TransactionalTemplateTests(SimpleTestCase):
+    def test_render(self):
+        template = TransactionalTemplate(
+            "greeting.html", "greeting.txt", variables=("name", "code")
+        )
+        self.assertEqual(
+            template.html_parts, ["<p>Hi ", "name", ", ", "name", "!</p>"]
+        )
+        self.assertEqual(
+            template.render({"name": "<Ann>", "code": 7}),
+            ("<p>Hi &lt;Ann&gt;, &lt;Ann&gt;!</p>", "Hi <Ann> (7)"),
+        )
+
+    def test_missing_variable_renders_empty(self):
+        template = TransactionalTemplate("greeting.html", "greeting.txt", ("name", "code"))
+        self.assertEqual(template.render({"name": "Ann"})[1], "Hi Ann ()")
+
+    def test_value_with_placeholder_is_not_substituted(self):
+        template = TransactionalTemplate("greeting.html", "greeting.txt", ("name", "code"))
+        _, text = template.render({"name": "\x00code\x00", "code": 7})
+        self.assertEqual(text, "Hi \x00code\x00 (7)")
+
+    def test_without_variables(self):
+        template = TransactionalTemplate("static.html")
+        self.assertEqual(template.render({}), ("<p>\x00\x00</p>", None))
+
+
+class OTPTemplateTests(SimpleTestCase):
+    def test_registered_at_startup(self):
+        html, text = TRANSACTIONAL_TEMPLATES["otp"].render({"otp": "123456"})
+        self.assertEqual(html, render_to_string("otp.html", {"otp": "123456"}))
+        self.assertEqual(text, render_to_string("otp.txt", {"otp": "123456"}))
+        self.assertIn("123456", text)
+
+
+# Prints the settings a SETTINGS_PROFILE differs in, in a fresh interpreter
+SETTINGS_SCRIPT = """
+import json
+
+import django
+from django.conf import settings
+
+django.setup()
+from django.urls import get_resolver
+
+get_resolver().url_patterns
+print(json.dumps({
+    "apps": settings.INSTALLED_APPS,
+    "middleware": settings.MIDDLEWARE,
+    "loaders": settings.TEMPLATES[0]["OPTIONS"].get("loaders"),
+    "schema_class": settings.REST_FRAMEWORK.get("DEFAULT_SCHEMA_CLASS"),
+}))
+"""
+
+
+class SettingsProfileTests(SimpleTestCase):
+    def load_settings(self, profile):
+        process = subprocess.run(
+            [sys.executable, "-c", SETTINGS_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=dict(
+                os.environ,
+                SETTINGS_PROFILE=profile,
+                DEBUG="1",
+                DJANGO_SETTINGS_MODULE="drf_template.settings",
+            ),
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        return json.loads(process.stdout.splitlines()[-1])
+
+    def test_production(self):
+        production = self.load_settings("production")
+        self.assertNotIn("drf_spectacular", production["apps"])
+        self.assertNotIn("debug_toolbar", production["apps"])
+        self.assertIsNone(production["schema_class"])
+        self.assertNotIn(
+            "debug_toolbar.middleware.DebugToolbarMiddleware", production["middleware"]
+        )
+        [(loader, loaders)] = production["loaders"]
+        self.assertEqual(loader, "django.template.loaders.cached.Loader")
+        self.assertIn("django.template.loaders.app_directories.Loader", loaders)
+
+        middleware = production["middleware"]
+        cors = middleware.index("corsheaders.middleware.CorsMiddleware")
+        self.assertLess(cors, middleware.index("django.middleware.common.CommonMiddleware"))
+        self.assertLess(
+            cors, middleware.index("django.contrib.sessions.middleware.SessionMiddleware")
+        )
+
+    def test_development(self):
+        development = self.load_settings("development")
+        self.assertIn("drf_spectacular", development["apps"])
+        self.assertIsNone(development["loaders"])
@@ -0,0 +1,132 @@
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+from core.validations import FileTooLarge
+
+# Leading bytes of the image formats accepted for upload, by file extension
+IMAGE_SIGNATURES = {
+    "jpg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "gif": (b"GIF87a", b"GIF89a"),
+}
+
+# Bytes needed to tell the formats apart
+SNIFF_LENGTH = 12
+
+
+def sniff_image_type(head):
+    """
+    Returns the extension of the image format `head` (the first bytes of a
+    file) starts with, or None if it is not an accepted image.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for extension, signatures in IMAGE_SIGNATURES.items():
+        if head.startswith(signatures):
+            return extension
+    return None
+
+
+class SizeLimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploaded files to temporary files, failing with `FileTooLarge`
+    as soon as a file grows past `max_size` bytes instead of after the whole
+    body was read. While the file is read its SHA-256 is computed and its
+    leading bytes are sniffed, the completed file carries them as `sha256`
+    and `image_type` (see `sniff_image_type`).
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # the multipart body is a little larger than the file it carries,
+        # reject what cannot fit before reading any of it
+        if self.max_size is not None and content_length > self.max_size + 64 * 1024:
+            raise FileTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.size = 0
+        self.head = b""
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.file.close()
+            raise FileTooLarge()
+        if len(self.head) < SNIFF_LENGTH:
+            self.head += raw_data[: SNIFF_LENGTH - len(self.head)]
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.hasher.hexdigest()
+        uploaded_file.image_type = sniff_image_type(self.head)
+        return uploaded_file
+
+
+def save_content_addressed(directory, uploaded_file, extension):
+    """
+    Stores the file under its SHA-256 in `directory`, writing nothing when
+    the same content was uploaded before.
+
+    Returns:
+        str: The storage name of the file.
+    """
+    sha256 = getattr(uploaded_file, "sha256", None)
+    if sha256 is None:
+        hasher = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+
+    name = "%s/%s.%s" % (directory, sha256, extension)
+    if not default_storage.exists(name):
+        saved_name = default_storage.save(name, uploaded_file)
+        if saved_name != name:
+            # stored concurrently by another upload of the same content
+            default_storage.delete(saved_name)
+    return name
+
+
+def get_thumbnail_name(name, size):
+    """
+    Returns the storage name of the `size` (width, height) thumbnail of the
+    image stored as `name`, e.g. profilepictures/thumbnails/<sha256>_64x64.png
+    """
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    return "%s/thumbnails/%s_%dx%d%s" % (directory, stem, size[0], size[1], extension)
+
+
+def generate_thumbnails(name, sizes):
+    """
+    Writes the thumbnails of the image stored as `name` that do not exist
+    yet, scaled to fit within each (width, height) of `sizes`. Runs as a
+    background task.
+    """
+    missing = [
+        size for size in sizes if not default_storage.exists(get_thumbnail_name(name, size))
+    ]
+    if not missing:
+        return
+    with default_storage.open(name) as f:
+        image = Image.open(f)
+        image.load()
+    image_format = image.format
+    for size in missing:
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, format=image_format)
+        default_storage.save(get_thumbnail_name(name, size), ContentFile(buffer.getvalue()))
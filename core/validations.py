@@ -45,4 +45,15 @@ class CustomValidationError(APIException):
             detail = detail
 
         # Leverages DRF's internal method for consistent error structure.
-        self.detail = _get_error_details(detail, code)
\ No newline at end of file
+        self.detail = _get_error_details(detail, code)
+
+
+class FileTooLarge(APIException):
+    """
+    Raised while an upload is streamed in as soon as it exceeds its size
+    limit, see `core.uploads.SizeLimitedUploadHandler`.
+    """
+
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _("Uploaded file is too large.")
+    default_code = "file_too_large"
@@ -1,3 +1,169 @@
-from django.shortcuts import render
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
 
-# Create your views here.
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+# Files named after the SHA-256 of their content, see core.uploads, never
+# change and can be cached for good
+CONTENT_ADDRESSED_NAME = re.compile(r"^(?P<sha256>[0-9a-f]{64})(_\d+x\d+)?\.\w+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+RANGE_HEADER = re.compile(r"^bytes=(?P<start>\d*)-(?P<end>\d*)$")
+
+# Compressed files are served as what they are, as FileResponse does, a
+# Content-Encoding would make clients decompress the download
+ENCODING_CONTENT_TYPES = {
+    "bzip2": "application/x-bzip",
+    "gzip": "application/gzip",
+    "xz": "application/x-xz",
+}
+
+
+def get_media_etag(filename, st):
+    name = os.path.basename(filename)
+    if CONTENT_ADDRESSED_NAME.match(name):
+        return quote_etag(os.path.splitext(name)[0])
+    return quote_etag("%x-%x" % (st.st_mtime_ns, st.st_size))
+
+
+def parse_range(header, size):
+    """
+    Parses a single byte range of a Range header.
+
+    Returns:
+        tuple: (start, end) with end inclusive, None when the header should
+               be ignored (invalid or multiple ranges), or () when the range
+               cannot be satisfied.
+    """
+    match = RANGE_HEADER.match(header.replace(" ", ""))
+    if not match or (not match["start"] and not match["end"]):
+        return None
+    if not match["start"]:
+        # suffix range, the last N bytes
+        length = int(match["end"])
+        if length == 0 or size == 0:
+            return ()
+        return max(size - length, 0), size - 1
+    start = int(match["start"])
+    end = int(match["end"]) if match["end"] else size - 1
+    if match["end"] and end < start:
+        return None
+    if start >= size:
+        return ()
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path, start, length, chunk_size=64 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves a file of MEDIA_ROOT.
+
+    Responses carry a strong ETag (the content hash for content-addressed
+    files) and Last-Modified, conditional requests get a 304 and single byte
+    ranges a 206. Content-addressed files are cacheable for a year.
+
+    With MEDIA_SENDFILE_HEADER set, only the headers are produced here and the
+    file itself is sent by the web server: "X-Accel-Redirect" (nginx) points
+    it at MEDIA_SENDFILE_PREFIX + path, "X-Sendfile" (Apache, lighttpd) at the
+    file's absolute path. Otherwise FileResponse lets the WSGI server use
+    wsgi.file_wrapper (os.sendfile) for whole files.
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        st = os.stat(fullpath)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    etag = get_media_etag(fullpath, st)
+    immutable = bool(CONTENT_ADDRESSED_NAME.match(os.path.basename(fullpath)))
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(st.st_mtime),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        not_modified = etag in parse_etags(if_none_match) or if_none_match.strip() == "*"
+    else:
+        not_modified = not was_modified_since(
+            request.headers.get("If-Modified-Since"), st.st_mtime
+        )
+    if not_modified:
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response.headers[header] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = ENCODING_CONTENT_TYPES.get(encoding, content_type)
+    content_type = content_type or "application/octet-stream"
+
+    sendfile_header = settings.MEDIA_SENDFILE_HEADER
+    if sendfile_header:
+        # the web server answers ranges and streams the file
+        response = HttpResponse(content_type=content_type)
+        if sendfile_header.lower() == "x-accel-redirect":
+            response.headers[sendfile_header] = settings.MEDIA_SENDFILE_PREFIX + quote(path)
+        else:
+            response.headers[sendfile_header] = fullpath
+    else:
+        byte_range = None
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and (not if_range or if_range.strip() == etag):
+            byte_range = parse_range(range_header, st.st_size)
+
+        if byte_range == ():
+            response = HttpResponse(status=416)
+            response.headers["Content-Range"] = "bytes */%d" % st.st_size
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                iter_file_range(fullpath, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response.headers["Content-Length"] = str(end - start + 1)
+            response.headers["Content-Range"] = "bytes %d-%d/%d" % (start, end, st.st_size)
+        else:
+            response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+
+    for header, value in headers.items():
+        response.headers[header] = value
+    return response
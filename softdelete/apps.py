@@ -1,5 +1,13 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
 
 
 class SoftdeleteConfig(AppConfig):
     name = "softdelete"
+
+    def ready(self):
+        from softdelete.models import SoftDeleteModel, get_cascade_plan
+
+        # resolve cascade plans once at startup instead of on first delete
+        for model in apps.get_models():
+            if issubclass(model, SoftDeleteModel):
+                get_cascade_plan(model)
@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, models
+
+from softdelete.models import SoftDeleteModel, get_cascade_plan
+
+
+def get_benchmark_models():
+    """
+    Scratch parent/child models, only registered when the benchmark runs,
+    their tables are created and dropped by the command
+    """
+
+    class SoftDeleteBenchmarkParent(SoftDeleteModel):
+        name = models.CharField(max_length=32)
+
+        class Meta:
+            app_label = "softdelete"
+            db_table = "softdelete_benchmark_parent"
+
+    class SoftDeleteBenchmarkChild(SoftDeleteModel):
+        parent = models.ForeignKey(SoftDeleteBenchmarkParent, on_delete=models.CASCADE)
+
+        class Meta:
+            app_label = "softdelete"
+            db_table = "softdelete_benchmark_child"
+
+    return SoftDeleteBenchmarkParent, SoftDeleteBenchmarkChild
+
+
+class Command(BaseCommand):
+    help = (
+        "Time repeated single-instance SoftDeleteModel.delete() and undelete() "
+        "calls with the collector, and set-based with and without cached "
+        "cascade plans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--instances", type=int, default=1000)
+        parser.add_argument("--children", type=int, default=5)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        parent_model, child_model = get_benchmark_models()
+
+        with connections[using].schema_editor() as editor:
+            editor.create_model(parent_model)
+            editor.create_model(child_model)
+        try:
+            parent_model.all_objects.using(using).bulk_create(
+                parent_model(name="parent%d" % i) for i in range(options["instances"])
+            )
+            parents = list(parent_model.all_objects.using(using).order_by("pk"))
+            child_model.all_objects.using(using).bulk_create(
+                child_model(parent=parent)
+                for parent in parents
+                for _ in range(options["children"])
+            )
+
+            self.run("collector", parents, using, set_based=False)
+            self.run(
+                "set-based, plan resolved per call",
+                parents,
+                using,
+                set_based=True,
+                clear_plans=True,
+            )
+            self.run("set-based, cached plan", parents, using, set_based=True)
+        finally:
+            with connections[using].schema_editor() as editor:
+                editor.delete_model(child_model)
+                editor.delete_model(parent_model)
+
+    def run(self, title, parents, using, set_based, clear_plans=False):
+        timings = {}
+        for method in ("delete", "undelete"):
+            started = time.perf_counter()
+            for parent in parents:
+                if clear_plans:
+                    get_cascade_plan.cache_clear()
+                getattr(parent, method)(using=using, set_based=set_based)
+            timings[method] = (time.perf_counter() - started) * 1000 / len(parents)
+        self.stdout.write(
+            "%-36s delete %.3f ms, undelete %.3f ms per instance"
+            % (title, timings["delete"], timings["undelete"])
+        )
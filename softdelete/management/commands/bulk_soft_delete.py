@@ -0,0 +1,91 @@
+import json
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from softdelete.models import SoftDeleteQuerySet
+
+
+class Command(BaseCommand):
+    help = (
+        "Soft-delete, undelete or hard-delete rows of a model in primary key "
+        "order, committing once per chunk. Progress is written to --state-file "
+        "so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="Model as app_label.ModelName")
+        parser.add_argument(
+            "--action",
+            choices=["delete", "undelete", "hard_delete"],
+            default="delete",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="LOOKUP=VALUE",
+            help="Queryset filter, can be given multiple times",
+        )
+        parser.add_argument(
+            "--set-based",
+            action="store_true",
+            help="Cascade model-wise in SQL instead of collecting instances",
+        )
+        parser.add_argument("--state-file", help="JSON file to record progress in")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+
+        filters = {}
+        for item in options["filter"]:
+            lookup, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError("Filters must look like LOOKUP=VALUE: %s" % item)
+            filters[lookup] = value
+
+        action = options["action"]
+        if action == "delete":
+            filters.setdefault("is_active", True)
+        elif action == "undelete":
+            filters.setdefault("is_active", False)
+        queryset = SoftDeleteQuerySet(model, using=options["database"]).filter(
+            **filters
+        )
+
+        state_file = options["state_file"]
+        start_after = None
+        if state_file and os.path.exists(state_file):
+            with open(state_file) as f:
+                start_after = json.load(f).get("last_pk")
+            self.stdout.write("Resuming after pk %s" % start_after)
+
+        def on_chunk(progress):
+            if state_file:
+                with open(state_file, "w") as f:
+                    json.dump({"last_pk": progress["last_pk"]}, f)
+            self.stdout.write(
+                "pk <= %(last_pk)s: %(rows)d rows in %(elapsed).2fs "
+                "(%(rows_per_second).0f rows/s)" % progress
+            )
+
+        kwargs = {
+            "using": options["database"],
+            "chunk_size": options["chunk_size"],
+            "start_after": start_after,
+            "on_chunk": on_chunk,
+        }
+        if action != "hard_delete":
+            kwargs["set_based"] = options["set_based"]
+        result = getattr(queryset, action)(**kwargs)
+
+        if state_file and os.path.exists(state_file):
+            os.remove(state_file)
+        if result is not None:
+            self.stdout.write(self.style.SUCCESS("Done: %d rows %s" % result))
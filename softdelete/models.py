@@ -1,6 +1,8 @@
 from __future__ import unicode_literals
 
-from collections import Counter
+import time
+from collections import Counter, namedtuple
+from functools import lru_cache
 from operator import attrgetter
 
 import six
@@ -8,12 +10,77 @@ from django.contrib.admin.utils import NestedObjects
 from django.core.exceptions import FieldDoesNotExist
 from django.db import models, router, transaction
 from django.db.models import signals, sql
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+from softdelete.signals import post_soft_delete_batch, pre_soft_delete_batch
+
+# Cascade plans drive the set-based mode (set_based=True) of
+# SoftDeleteHelper only, the default mode collects instances with
+# NestedObjects. lookup joins model back to the root model of the plan.
+CascadeStep = namedtuple("CascadeStep", ["model", "lookup", "soft_deletable"])
+CascadePlan = namedtuple("CascadePlan", ["model", "soft_deletable", "steps"])
+
+
+@lru_cache(maxsize=None)
+def is_soft_deletable(model):
+    """check whether model has the is_active field used for soft-delete"""
+    try:
+        model._meta.get_field("is_active")
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def get_cascade_steps(model, lookup=None, path=()):
+    """
+    Walk on-delete cascade relations of model, model-wise, children listed
+    before their parents (topological order) so an update never hides rows
+    that a later subquery still has to match.
+
+    Relations leading back to a model already on the current path
+    (self-referencing or cyclic cascades) are not followed.
+    """
+    steps = []
+    path = path + (model,)
+    for related in get_candidate_relations_to_delete(model._meta):
+        if related.on_delete is not models.CASCADE:
+            continue
+        related_model = related.related_model
+        if related_model in path:
+            continue
+        related_lookup = related.field.name
+        if lookup is not None:
+            related_lookup = "%s__%s" % (related_lookup, lookup)
+        steps.extend(get_cascade_steps(related_model, related_lookup, path))
+        steps.append(
+            CascadeStep(
+                model=related_model,
+                lookup=related_lookup,
+                soft_deletable=is_soft_deletable(related_model),
+            )
+        )
+    return steps
+
+
+@lru_cache(maxsize=None)
+def get_cascade_plan(model):
+    """
+    Return the cascade plan of model used by set-based soft-delete/undelete,
+    resolved once per model since the relation graph does not change after
+    app loading
+    """
+    return CascadePlan(
+        model=model,
+        soft_deletable=is_soft_deletable(model),
+        steps=tuple(get_cascade_steps(model)),
+    )
 
 
 class SoftDeleteHelper:
-    def __init__(self, using="default", delete_type="soft_delete"):
+    def __init__(self, using="default", delete_type="soft_delete", set_based=False):
         self.using = using
         self.delete_type = delete_type
+        self.set_based = set_based
 
     def collect_objects(self, objs):
         """
@@ -22,27 +89,23 @@ class SoftDeleteHelper:
         collector = NestedObjects(using=self.using)
         collector.collect(objs)
 
-        if self.delete_type == "soft_delete":
+        if self.delete_type != "hard_delete":
             collector = self.get_un_soft_deleted_objects(collector)
 
         return collector
 
     def get_un_soft_deleted_objects(self, collector):
-        """filter all those objects from collector which are already
-        soft-deleted"""
+        """filter collector down to the objects to change: active ones when
+        soft-deleting, soft-deleted ones when undeleting. Objects of models
+        that are not made to soft-delete are left as they are"""
+        is_active = self.delete_type == "soft_delete"
         for model, instances in collector.data.items():
             collector.data[model] = set()
-            try:
-                if model._meta.get_field("is_active"):
-                    for instance in instances:
-                        if instance.is_active:
-                            collector.data[model].add(instance)
-                    # collector.data[model] = set(
-                    #     filter(lambda x: not x.is_active, instances)
-                    # )
-            except FieldDoesNotExist:
-                # if deleted field does not exist in model, do nothing
-                pass
+            # if deleted field does not exist in model, do nothing
+            if is_soft_deletable(model):
+                for instance in instances:
+                    if instance.is_active == is_active:
+                        collector.data[model].add(instance)
         return collector
 
     def sort_all_objects(self, collector):
@@ -61,34 +124,130 @@ class SoftDeleteHelper:
             [obj.pk for obj in instances], {"is_active": is_active}, self.using
         )
 
-    def sql_hard_delete(self, model, instances):
-        query = sql.DeleteQuery(model)
-        query.delete_batch([obj.pk for obj in instances], self.using)
-
     def send_signal(self, model, instances, signal_type):
         """
-        Handle pre/post delete/save signal callings
+        Handle pre/post delete/save signal callings, nothing is looped over
+        when no receiver is connected for model
+        """
+        if model._meta.auto_created:
+            return
+        signal = getattr(signals, signal_type)
+        if not signal.has_listeners(model):
+            return
+        kwargs = {"sender": model, "using": self.using}
+        if signal_type in ("pre_save", "post_save"):
+            kwargs["created"] = False
+        for obj in instances:
+            signal.send(instance=obj, **kwargs)
+
+    def send_batch_signal(self, model, instances, signal):
+        """
+        Handle pre/post soft-delete batch signal, sent once with all instances
+        of a soft-deletable model
+        """
+        if (
+            instances
+            and signal.has_listeners(model)
+            and not model._meta.auto_created
+            and is_soft_deletable(model)
+        ):
+            signal.send(
+                sender=model,
+                instances=instances,
+                delete_type=self.delete_type,
+                using=self.using,
+            )
+
+    def get_root_queryset(self, objs):
+        """
+        Return a queryset matching objs without loading them into memory
+        """
+        if isinstance(objs, models.QuerySet):
+            return objs.using(self.using)
+        model = objs[0].__class__
+        return model._base_manager.using(self.using).filter(
+            pk__in=[obj.pk for obj in objs]
+        )
+
+    def has_listeners(self, model, *signal_types):
+        """check whether a per-instance or batch signal receiver is connected
+        for model"""
+        return (
+            pre_soft_delete_batch.has_listeners(model)
+            or post_soft_delete_batch.has_listeners(model)
+            or any(
+                getattr(signals, signal_type).has_listeners(model)
+                for signal_type in signal_types
+            )
+        )
+
+    def sql_set_based_update(self, model, queryset):
+        """
+        Soft-delete/undelete all rows of queryset with a single UPDATE,
+        instances are only loaded when a signal receiver is connected
         """
-        if not model._meta.auto_created:
-            for obj in instances:
-                if signal_type.__contains__("save"):
-                    getattr(signals, signal_type).send(
-                        sender=model, instance=obj, created=False, using=self.using
-                    )
-                else:
-                    getattr(signals, signal_type).send(
-                        sender=model, instance=obj, using=self.using
-                    )
-
-    @transaction.atomic
+        if self.delete_type == "soft_delete":
+            pre_signal, post_signal, is_active = "pre_delete", "post_delete", False
+        else:
+            pre_signal, post_signal, is_active = "pre_save", "post_save", True
+        queryset = queryset.filter(is_active=not is_active)
+
+        instances = None
+        if not model._meta.auto_created and self.has_listeners(
+            model, pre_signal, post_signal
+        ):
+            instances = list(queryset)
+            self.send_batch_signal(model, instances, pre_soft_delete_batch)
+            self.send_signal(model, instances, pre_signal)
+        count = queryset.update(is_active=is_active)
+        if instances is not None:
+            self.send_signal(model, instances, post_signal)
+            self.send_batch_signal(model, instances, post_soft_delete_batch)
+        return count
+
+    def do_set_based_work(self, objs):
+        """
+        Soft-delete/undelete objs and their cascaded relations with one
+        UPDATE ... WHERE fk IN (subquery) per relation, so the cost depends on
+        the number of related models rather than the number of rows
+        """
+        root = self.get_root_queryset(objs)
+        root_pks = root.values("pk")
+
+        deleted_counter = Counter()
+        for step in get_cascade_plan(root.model).steps:
+            if not step.soft_deletable:
+                # rows of models that are not made to soft-delete are left
+                # as they are, same as with the collector, on delete and
+                # undelete
+                continue
+            queryset = step.model._base_manager.using(self.using).filter(
+                **{"%s__in" % step.lookup: root_pks}
+            )
+            count = self.sql_set_based_update(step.model, queryset)
+            if count:
+                deleted_counter[step.model._meta.model_name] += count
+        count = self.sql_set_based_update(root.model, root)
+        if count:
+            deleted_counter[root.model._meta.model_name] += count
+        return sum(deleted_counter.values()), dict(deleted_counter)
+
     def do_work(self, objs):
         """
         Method, call all helper methods to do soft-delete/undelete or
-        hard-delete
+        hard-delete. Returns None when objs is empty, except for querysets in
+        set-based mode, which are not evaluated to find out and return
+        (0, {}) instead.
+        Callers run it in a transaction on self.using.
         """
-        if not objs:
+        set_based = self.set_based and self.delete_type != "hard_delete"
+        # set-based work does not evaluate querysets, an empty one updates
+        # nothing
+        if not (set_based and isinstance(objs, models.QuerySet)) and not objs:
             # no object to delete/undelete
             return None
+        if set_based:
+            return self.do_set_based_work(objs)
         # collect all related objects
         collector = self.collect_objects(objs)
         # sort collected objects
@@ -99,36 +258,90 @@ class SoftDeleteHelper:
         if self.delete_type == "hard_delete":
             return collector.delete()
         for model, instances in six.iteritems(collector.data):
+            if not instances:
+                continue
             # send pre-delete signals
+            self.send_batch_signal(model, instances, pre_soft_delete_batch)
             if self.delete_type == "soft_delete":
                 self.send_signal(model, instances, "pre_delete")
             else:
                 self.send_signal(model, instances, "pre_save")
-            try:
-                if self.delete_type == "soft_delete":
-                    self.sql_model_wise_batch_update(model, instances, is_active=False)
-                else:
-                    self.sql_model_wise_batch_update(model, instances, is_active=True)
-                deleted_counter[model._meta.model_name] += len(instances)
-            except FieldDoesNotExist:
-                # hard-delete instnaces of those model that are not made to
-                # soft-delete
-                self.sql_hard_delete(model, instances)
-                deleted_counter[model._meta.model_name] += len(instances)
+            if self.delete_type == "soft_delete":
+                self.sql_model_wise_batch_update(model, instances, is_active=False)
+            else:
+                self.sql_model_wise_batch_update(model, instances, is_active=True)
+            deleted_counter[model._meta.model_name] += len(instances)
 
             # send post-delete signals
             if self.delete_type == "soft_delete":
                 self.send_signal(model, instances, "post_delete")
             else:
                 self.send_signal(model, instances, "post_save")
+            self.send_batch_signal(model, instances, post_soft_delete_batch)
+        return sum(deleted_counter.values()), dict(deleted_counter)
+
+    def do_chunked_work(self, queryset, chunk_size, start_after=None, on_chunk=None):
+        """
+        Call do_work on queryset in primary key (keyset) order, chunk_size
+        rows at a time, committing once per chunk.
+        on_chunk is called after every committed chunk with a dict holding
+        last_pk, rows, elapsed and rows_per_second; passing the last reported
+        last_pk back as start_after resumes an interrupted run.
+        """
+        deleted_counter = Counter()
+        pks = queryset.using(self.using).order_by("pk").values_list("pk", flat=True)
+        base_queryset = queryset.model._base_manager.using(self.using)
+        while True:
+            chunk_pks = pks if start_after is None else pks.filter(pk__gt=start_after)
+            chunk_pks = list(chunk_pks[:chunk_size])
+            if not chunk_pks:
+                break
+
+            started = time.monotonic()
+            with transaction.atomic(using=self.using):
+                result = self.do_work(base_queryset.filter(pk__in=chunk_pks))
+            elapsed = time.monotonic() - started
+
+            rows = 0
+            if result is not None:
+                rows = result[0]
+                deleted_counter.update(result[1])
+            start_after = chunk_pks[-1]
+            if on_chunk is not None:
+                on_chunk(
+                    {
+                        "last_pk": start_after,
+                        "rows": rows,
+                        "elapsed": elapsed,
+                        "rows_per_second": rows / elapsed if elapsed else 0,
+                    }
+                )
         return sum(deleted_counter.values()), dict(deleted_counter)
 
 
 class SoftDeleteQuerySet(models.QuerySet):
-    @transaction.atomic
-    def delete(self, using=None):
+    def run_helper(self, helper, chunk_size=None, start_after=None, on_chunk=None):
+        """
+        Run helper on this queryset in one transaction, or chunk-wise with
+        one transaction per chunk when chunk_size is given
+        """
+        if chunk_size:
+            return helper.do_chunked_work(self, chunk_size, start_after, on_chunk)
+        with transaction.atomic(using=helper.using):
+            return helper.do_work(self)
+
+    def delete(
+        self,
+        using=None,
+        set_based=False,
+        chunk_size=None,
+        start_after=None,
+        on_chunk=None,
+    ):
         """setting deleted attribtue to new UUID', also soft-deleting all its
-        related objects if they are on delete cascade"""
+        related objects if they are on delete cascade.
+        With chunk_size, rows are processed in primary key order and committed
+        chunk-wise, see SoftDeleteHelper.do_chunked_work"""
         using = using or "default"
 
         assert self.query.can_filter(), "Cannot use 'limit' or 'offset' with delete."
@@ -141,11 +354,19 @@ class SoftDeleteQuerySet(models.QuerySet):
         except AttributeError:
             pass
 
-        helper = SoftDeleteHelper(using=using, delete_type="soft_delete")
-        return helper.do_work(self)
-
-    @transaction.atomic
-    def undelete(self, using=None):
+        helper = SoftDeleteHelper(
+            using=using, delete_type="soft_delete", set_based=set_based
+        )
+        return self.run_helper(helper, chunk_size, start_after, on_chunk)
+
+    def undelete(
+        self,
+        using=None,
+        set_based=False,
+        chunk_size=None,
+        start_after=None,
+        on_chunk=None,
+    ):
         """setting deleted attribtue to True', also soft-deleting all its
         related objects if they are on delete cascade"""
         using = using or "default"
@@ -161,11 +382,12 @@ class SoftDeleteQuerySet(models.QuerySet):
         except AttributeError:
             pass
 
-        helper = SoftDeleteHelper(using=using, delete_type="soft_undelete")
-        return helper.do_work(self)
+        helper = SoftDeleteHelper(
+            using=using, delete_type="soft_undelete", set_based=set_based
+        )
+        return self.run_helper(helper, chunk_size, start_after, on_chunk)
 
-    @transaction.atomic
-    def hard_delete(self, using=None):
+    def hard_delete(self, using=None, chunk_size=None, start_after=None, on_chunk=None):
         using = using or "default"
 
         assert self.query.can_filter(), "Cannot use 'limit' or 'offset' with delete."
@@ -179,7 +401,7 @@ class SoftDeleteQuerySet(models.QuerySet):
         except AttributeError:
             pass
         helper = SoftDeleteHelper(using=using, delete_type="hard_delete")
-        helper.do_work(self)
+        return self.run_helper(helper, chunk_size, start_after, on_chunk)
 
     def only_deleted(self):
         if self.deleted_also:
@@ -229,34 +451,41 @@ class SoftDeleteModel(models.Model):
     objects = SoftDeleteManager()
     all_objects = SoftDeleteManager(deleted_also=True)
 
-    @transaction.atomic
-    def delete(self, using=None):
+    def delete(self, using=None, set_based=False):
         """
         Setting deleted attribtue to new UUID',
         also if related objects are on delete cascade:
           they will be soft deleted if those related objects have soft deletion
           capability
           else they will be hard deleted.
+        With set_based=True related objects are updated model-wise in SQL
+        without being loaded.
         """
         using = using or router.db_for_write(self.__class__, instance=self)
-        helper = SoftDeleteHelper(using=using, delete_type="soft_delete")
-        return helper.do_work([self])
+        helper = SoftDeleteHelper(
+            using=using, delete_type="soft_delete", set_based=set_based
+        )
+        with transaction.atomic(using=using):
+            return helper.do_work([self])
 
-    @transaction.atomic
-    def undelete(self, using=None):
+    def undelete(self, using=None, set_based=False):
         """setting deleted attribtue to False of current object and all its
         related objects if they are on delete cascade"""
         using = using or router.db_for_write(self.__class__, instance=self)
-        helper = SoftDeleteHelper(using=using, delete_type="soft_undelete")
-        return helper.do_work([self])
+        helper = SoftDeleteHelper(
+            using=using, delete_type="soft_undelete", set_based=set_based
+        )
+        with transaction.atomic(using=using):
+            return helper.do_work([self])
 
-    @transaction.atomic
     def hard_delete(self, using=None):
         """setting deleted attribtue to False of current object and all its
         related objects if they are on delete cascade"""
         using = using or router.db_for_write(self.__class__, instance=self)
         helper = SoftDeleteHelper(using=using, delete_type="hard_delete")
-        return helper.do_work([self])
+        with transaction.atomic(using=using):
+            return helper.do_work([self])
 
     class Meta:
         abstract = True
+
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent once per model with the whole list of instances being soft-deleted or
+# undeleted, receivers get sender, instances, delete_type and using.
+pre_soft_delete_batch = Signal()
+post_soft_delete_batch = Signal()
@@ -0,0 +1,241 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import models, transaction
+from django.db.models import signals
+from django.test import TestCase, TransactionTestCase
+
+from softdelete.models import SoftDeleteHelper, SoftDeleteModel
+from softdelete.signals import post_soft_delete_batch, pre_soft_delete_batch
+
+
+class Parent(SoftDeleteModel):
+    name = models.CharField(max_length=20)
+
+    class Meta:
+        app_label = "softdelete"
+
+
+class Child(SoftDeleteModel):
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE)
+
+    class Meta:
+        app_label = "softdelete"
+
+
+class Note(models.Model):
+    """not made to soft-delete"""
+
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE)
+
+    class Meta:
+        app_label = "softdelete"
+
+
+SIGNALS = {
+    "pre_delete": signals.pre_delete,
+    "post_delete": signals.post_delete,
+    "pre_save": signals.pre_save,
+    "post_save": signals.post_save,
+    "pre_soft_delete_batch": pre_soft_delete_batch,
+    "post_soft_delete_batch": post_soft_delete_batch,
+}
+
+
+class SoftDeleteTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parents = [Parent.objects.create(name=str(i)) for i in range(3)]
+        for parent in cls.parents:
+            Child.objects.bulk_create(Child(parent=parent) for _ in range(2))
+            Note.objects.create(parent=parent)
+        # already soft-deleted, neither mode counts it again
+        Child.all_objects.filter(pk=Child.all_objects.first().pk).update(
+            is_active=False
+        )
+
+    def snapshot(self):
+        return {
+            "parents": list(Parent.all_objects.order_by("pk").values_list("pk", "is_active")),
+            "children": list(Child.all_objects.order_by("pk").values_list("pk", "is_active")),
+            "notes": list(Note.objects.order_by("pk").values_list("pk", flat=True)),
+        }
+
+
+class SoftDeleteModesTests(SoftDeleteTestCase):
+    """
+    The collector (default) and set-based modes leave the same data and send
+    the same signals.
+    """
+
+    def run_mode(self, delete_type, set_based):
+        """
+        Runs the helper on the first two parents and rolls back, returns its
+        result, the data it left and the signals it sent.
+        """
+        received = []
+
+        def receiver(signal, sender, **kwargs):
+            name = next(name for name, s in SIGNALS.items() if s is signal)
+            if "instances" in kwargs:
+                pks = tuple(sorted(instance.pk for instance in kwargs["instances"]))
+            else:
+                pks = kwargs["instance"].pk
+            received.append((name, sender.__name__, pks))
+
+        for signal in SIGNALS.values():
+            for model in (Parent, Child, Note):
+                signal.connect(receiver, sender=model, weak=False)
+        try:
+            with transaction.atomic():
+                objs = list(Parent.all_objects.filter(pk__in=[p.pk for p in self.parents[:2]]))
+                result = SoftDeleteHelper(
+                    delete_type=delete_type, set_based=set_based
+                ).do_work(objs)
+                snapshot = self.snapshot()
+                transaction.set_rollback(True)
+        finally:
+            for signal in SIGNALS.values():
+                for model in (Parent, Child, Note):
+                    signal.disconnect(receiver, sender=model)
+        return result, snapshot, sorted(received)
+
+    def assertModesMatch(self, delete_type):
+        collected = self.run_mode(delete_type, set_based=False)
+        set_based = self.run_mode(delete_type, set_based=True)
+        self.assertEqual(collected[0], set_based[0])
+        self.assertEqual(collected[1], set_based[1])
+        self.assertEqual(collected[2], set_based[2])
+        return collected
+
+    def test_delete(self):
+        result, snapshot, received = self.assertModesMatch("soft_delete")
+        # 2 parents and their 3 children still active
+        self.assertEqual(result, (5, {"parent": 2, "child": 3}))
+        # notes are not made to soft-delete and are left as they are
+        self.assertEqual(len(snapshot["notes"]), 3)
+        self.assertIn(("pre_delete", "Child", snapshot["children"][1][0]), received)
+
+    def test_undelete(self):
+        Parent.all_objects.filter(pk__in=[p.pk for p in self.parents[:2]]).delete()
+
+        result, snapshot, _ = self.assertModesMatch("soft_undelete")
+        self.assertEqual(result, (6, {"parent": 2, "child": 4}))
+        self.assertEqual(len(snapshot["notes"]), 3)
+        self.assertTrue(all(is_active for _, is_active in snapshot["children"]))
+
+    def test_empty(self):
+        for set_based in (False, True):
+            self.assertIsNone(SoftDeleteHelper(set_based=set_based).do_work([]))
+        queryset = Parent.all_objects.none()
+        self.assertIsNone(SoftDeleteHelper().do_work(queryset))
+        # querysets are not evaluated in set-based mode
+        self.assertEqual(SoftDeleteHelper(set_based=True).do_work(queryset), (0, {}))
+
+
+class ChunkFailed(Exception):
+    pass
+
+
+class ChunkedWorkTests(TransactionTestCase):
+    """
+    Runs outside a test transaction so every chunk really commits.
+    """
+
+    # reads outside a transaction go to the replicas, if configured
+    databases = "__all__"
+
+    def setUp(self):
+        self.parents = [Parent.objects.create(name=str(i)) for i in range(3)]
+        for parent in self.parents:
+            Child.objects.create(parent=parent)
+        self.events = []
+
+    def fail_on(self, parent):
+        """
+        Raise ChunkFailed when parent gets soft-deleted, until the returned
+        function is called
+        """
+
+        def receiver(sender, instances, **kwargs):
+            if parent.pk in {instance.pk for instance in instances}:
+                raise ChunkFailed
+
+        def disconnect():
+            pre_soft_delete_batch.disconnect(receiver, sender=Parent)
+
+        pre_soft_delete_batch.connect(receiver, sender=Parent, weak=False)
+        self.addCleanup(disconnect)
+        return disconnect
+
+    def active_parents(self):
+        return list(Parent.objects.order_by("pk").values_list("pk", flat=True))
+
+    def test_one_commit_per_chunk(self):
+        def receiver(sender, instances, **kwargs):
+            transaction.on_commit(lambda: self.events.append("commit"))
+
+        post_soft_delete_batch.connect(receiver, sender=Parent, weak=False)
+        self.addCleanup(post_soft_delete_batch.disconnect, receiver, sender=Parent)
+
+        result = Parent.objects.all().delete(
+            chunk_size=2, on_chunk=lambda progress: self.events.append(progress)
+        )
+        self.assertEqual(result, (6, {"parent": 3, "child": 3}))
+        self.assertEqual(self.events[0::2], ["commit", "commit"])
+        progress = self.events[1::2]
+        self.assertEqual(
+            [(p["last_pk"], p["rows"]) for p in progress],
+            [(self.parents[1].pk, 4), (self.parents[2].pk, 2)],
+        )
+        for p in progress:
+            self.assertEqual(set(p), {"last_pk", "rows", "elapsed", "rows_per_second"})
+            self.assertGreaterEqual(p["rows_per_second"], 0)
+
+    def test_failed_chunk_keeps_committed_chunks(self):
+        self.fail_on(self.parents[1])
+        with self.assertRaises(ChunkFailed):
+            Parent.objects.all().delete(chunk_size=1, on_chunk=self.events.append)
+        self.assertEqual([p["last_pk"] for p in self.events], [self.parents[0].pk])
+        self.assertEqual(self.active_parents(), [self.parents[1].pk, self.parents[2].pk])
+
+    def test_start_after_resumes(self):
+        result = Parent.objects.all().delete(
+            chunk_size=1, start_after=self.parents[0].pk, on_chunk=self.events.append
+        )
+        self.assertEqual(result, (4, {"parent": 2, "child": 2}))
+        self.assertEqual(self.active_parents(), [self.parents[0].pk])
+        self.assertEqual(
+            [p["last_pk"] for p in self.events], [self.parents[1].pk, self.parents[2].pk]
+        )
+
+    def test_without_chunk_size_runs_in_one_transaction(self):
+        self.fail_on(self.parents[1])
+        with self.assertRaises(ChunkFailed):
+            Parent.objects.all().delete()
+        self.assertEqual(self.active_parents(), [p.pk for p in self.parents])
+
+    def test_bulk_soft_delete_command_resumes_from_state_file(self):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        state_file = os.path.join(state_dir.name, "state.json")
+        args = ["bulk_soft_delete", "softdelete.Parent", "--chunk-size=1"]
+        args.append("--state-file=%s" % state_file)
+
+        disconnect = self.fail_on(self.parents[1])
+        with self.assertRaises(ChunkFailed):
+            call_command(*args, stdout=StringIO())
+        with open(state_file) as f:
+            self.assertEqual(json.load(f), {"last_pk": self.parents[0].pk})
+        disconnect()
+
+        stdout = StringIO()
+        call_command(*args, stdout=stdout)
+        self.assertIn("Resuming after pk %s" % self.parents[0].pk, stdout.getvalue())
+        self.assertIn("Done: 4 rows", stdout.getvalue())
+        self.assertEqual(self.active_parents(), [])
+        # removed once the run completes
+        self.assertFalse(os.path.exists(state_file))